@@ -1,8 +1,8 @@
 from django.contrib import admin
 from .models import (
     Profile, Follow, Post, Like, Comment, Message, Notification,
-    Story, StoryView, StoryHighlight, Video, VideoLike, VideoComment, 
-    Playlist, Group, GroupMembership, GroupPost, GroupPostLike, GroupPostComment
+    Story, ArchivedStory, StoryView, StoryHighlight, Video, VideoLike, VideoComment, 
+    RelatedVideo, Playlist, PlaylistVideo, Group, GroupMembership, GroupPost, GroupPostLike, GroupPostComment
 )
 
 @admin.register(Profile)
@@ -47,7 +47,7 @@ class MessageAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'actor', 'notification_type', 'is_read', 'created_at')
+    list_display = ('user', 'actor', 'notification_type', 'actor_count', 'is_read', 'updated_at')
     search_fields = ('user__username', 'actor__username')
     list_filter = ('notification_type', 'is_read', 'created_at')
 
@@ -58,6 +58,13 @@ class StoryAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     readonly_fields = ('created_at', 'expires_at')
 
+@admin.register(ArchivedStory)
+class ArchivedStoryAdmin(admin.ModelAdmin):
+    list_display = ('original_id', 'author', 'view_count', 'created_at', 'archived_at')
+    search_fields = ('author__username', 'caption')
+    list_filter = ('archived_at',)
+    readonly_fields = ('original_id', 'created_at', 'expires_at', 'archived_at')
+
 @admin.register(StoryView)
 class StoryViewAdmin(admin.ModelAdmin):
     list_display = ('story', 'viewer', 'viewed_at')
@@ -88,12 +95,23 @@ class VideoCommentAdmin(admin.ModelAdmin):
     search_fields = ('author__username', 'content', 'video__title')
     list_filter = ('created_at',)
 
+@admin.register(RelatedVideo)
+class RelatedVideoAdmin(admin.ModelAdmin):
+    list_display = ('video', 'related', 'score', 'created_at')
+    search_fields = ('video__title', 'related__title')
+    raw_id_fields = ('video', 'related')
+
+class PlaylistVideoInline(admin.TabularInline):
+    model = PlaylistVideo
+    raw_id_fields = ('video',)
+    extra = 0
+
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'is_public', 'created_at')
     search_fields = ('title', 'user__username')
     list_filter = ('is_public', 'created_at')
-    filter_horizontal = ('videos',)
+    inlines = [PlaylistVideoInline]
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,196 @@
+"""
+View-level benchmarks.
+
+`run_benchmarks` drives the key endpoints through the Django test client
+against whatever data is in the database (normally a dataset from the
+generate_dataset command), logged in as a busy synthetic user. For every
+endpoint it records:
+
+  - p50 / p95 / mean latency over `iterations` requests, after warm-up
+  - the number of queries of one request (see core/query_budget.py)
+  - the peak memory allocated during one request (tracemalloc)
+
+Query counts and allocations are measured on separate requests so the
+instrumentation does not inflate the latencies. Results are plain JSON;
+`compare_results` checks them against a saved baseline and lists the
+regressions (the benchmark_views command fails when there are any).
+"""
+import json
+import math
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+from .models import Group, Message
+from .query_budget import QueryRecorder
+from .synthetic import SYNTHETIC_PREFIX
+
+ITERATIONS = 20
+WARMUP = 3
+TOLERANCE = 0.2
+# Latency changes below this are noise whatever the percentage
+MIN_LATENCY_DELTA_MS = 2.0
+
+
+class BenchmarkContext:
+    """The viewer and the objects the endpoints are requested for"""
+
+    def __init__(self, prefix=SYNTHETIC_PREFIX):
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        if not users.exists():
+            users = User.objects.all()
+
+        # Worst realistic case: the user following the most accounts
+        self.viewer = users.annotate(total=Count('following')).order_by('-total', 'id').first()
+        if self.viewer is None:
+            raise ValueError('No users to benchmark with; run generate_dataset first')
+        self.star = users.annotate(total=Count('followers')).order_by('-total', 'id').first()
+
+        partner = Message.objects.filter(recipient=self.viewer).values('sender').annotate(
+            total=Count('id')
+        ).order_by('-total', 'sender').values_list('sender', flat=True).first()
+        self.partner = User.objects.filter(id=partner).first() or self.star
+
+        self.group = Group.objects.filter(privacy='public').annotate(
+            total=Count('members')
+        ).order_by('-total', 'id').first()
+        self.search = f'{prefix}_1'
+
+
+# name: (method, url name, args from the context, request data)
+ENDPOINTS = {
+    'feed': ('get', 'feed', lambda ctx: [], None),
+    'profile': ('get', 'profile', lambda ctx: [ctx.star.username], None),
+    'messages_list': ('get', 'messages_list', lambda ctx: [], None),
+    'message_detail': ('get', 'message_detail', lambda ctx: [ctx.partner.username], None),
+    'notifications': ('get', 'notifications', lambda ctx: [], None),
+    'videos_feed': ('get', 'videos_feed', lambda ctx: [], None),
+    'group_detail': ('get', 'group_detail', lambda ctx: [ctx.group.id] if ctx.group else None, None),
+    'search_users': ('get', 'search_users', lambda ctx: [], lambda ctx: {'q': ctx.search}),
+    'ai_suggestions': ('post', 'ai_suggestions', lambda ctx: [], lambda ctx: json.dumps({
+        'text': 'Just finished an amazing project with the team, feeling great about the launch'
+    })),
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _request(client, method, url, data):
+    if method == 'post':
+        return client.post(url, data, content_type='application/json')
+    return client.get(url, data)
+
+
+def benchmark_endpoint(client, method, url, data, iterations=ITERATIONS, warmup=WARMUP, cold=False):
+    for _ in range(warmup):
+        _request(client, method, url, data)
+
+    timings = []
+    status = None
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        response = _request(client, method, url, data)
+        timings.append((time.perf_counter() - started) * 1000)
+        status = response.status_code
+
+    if cold:
+        cache.clear()
+    with QueryRecorder() as recorder:
+        _request(client, method, url, data)
+
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        _request(client, method, url, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': status,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'queries': recorder.count,
+        'sql_ms': round(recorder.total_time * 1000, 2),
+        'alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(names=None, iterations=ITERATIONS, warmup=WARMUP, cold=False, prefix=SYNTHETIC_PREFIX, log=None):
+    """Benchmark the endpoints in `names` (default: all); returns the results dict"""
+    log = log or (lambda message: None)
+    context = BenchmarkContext(prefix)
+    client = Client()
+    client.force_login(context.viewer)
+
+    endpoints = {}
+    for name, (method, url_name, args, data) in ENDPOINTS.items():
+        if names and name not in names:
+            continue
+        url_args = args(context)
+        if url_args is None:
+            log(f'   {name:<16} skipped (no data)')
+            continue
+        try:
+            url = reverse(url_name, args=url_args)
+        except NoReverseMatch:
+            log(f'   {name:<16} skipped (not installed)')
+            continue
+
+        result = benchmark_endpoint(
+            client, method, url, data(context) if data else None, iterations, warmup, cold
+        )
+        endpoints[name] = result
+        log(
+            f'   {name:<16} p50 {result["p50_ms"]:>8.1f}ms  p95 {result["p95_ms"]:>8.1f}ms  '
+            f'{result["queries"]:>3} queries  {result["alloc_kb"]:>8.0f} KB  [{result["status"]}]'
+        )
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'viewer': context.viewer.username,
+        'users': User.objects.count(),
+        'iterations': iterations,
+        'cold_cache': cold,
+        'endpoints': endpoints,
+    }
+
+
+def compare_results(results, baseline, tolerance=TOLERANCE):
+    """Return a list of human-readable regressions of `results` against `baseline`"""
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+
+        if current['queries'] > previous['queries']:
+            regressions.append(f'{name}: {previous["queries"]} -> {current["queries"]} queries')
+
+        for metric in ('p50_ms', 'p95_ms'):
+            delta = current[metric] - previous[metric]
+            if delta > previous[metric] * tolerance and delta > MIN_LATENCY_DELTA_MS:
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+
+        if current['alloc_kb'] > previous['alloc_kb'] * (1 + tolerance):
+            regressions.append(f'{name}: allocations {previous["alloc_kb"]} -> {current["alloc_kb"]} KB')
+
+    return regressions
@@ -0,0 +1,159 @@
+"""
+Per-object cache with versioned keys.
+
+Everything cached about an object (the object itself, its counts, lists
+hanging off it) lives under keys that embed the object's current version:
+
+    obj:core.video:42:v1718000000123:detail
+
+The version is stored under its own key and replaced by the signals in
+core/signals.py whenever the object is saved or deleted, or something that
+its cached data depends on changes (a like on a video, a follow for a
+profile's counts). Old entries are then never read again and simply expire,
+so invalidation is one cache write however many entries an object has.
+
+Versions are millisecond timestamps rather than counters: if a version key is
+evicted, the next one can never collide with a version still present in
+older entries.
+
+Profiles are versioned by user id, as pages look them up by user.
+
+Users reach the cache only as public profile data: every cached query defers
+PRIVATE_USER_FIELDS (password hash, email, last login), so those are never
+pickled into a cache entry.
+
+Invalidation is a cache write, so it only reaches every worker when they share
+the cache (CACHE_BACKEND=redis, the production default). With the per-process
+locmem backend each worker keeps its own versions and serves its own copies
+until they expire.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+
+from .models import Profile, Video, Group, Playlist
+
+OBJECT_CACHE_TIMEOUT = 60 * 5
+VERSION_TIMEOUT = 60 * 60 * 24 * 7
+
+PRIVATE_USER_FIELDS = ('password', 'email', 'last_login')
+
+
+def private_user_fields(prefix=''):
+    """PRIVATE_USER_FIELDS of the user reached through `prefix` (e.g. 'author__'), for defer()"""
+    return [f'{prefix}{field}' for field in PRIVATE_USER_FIELDS]
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _version_key(model, pk):
+    return f'objver:{_label(model)}:{pk}'
+
+
+def object_version(model, pk):
+    key = _version_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns() // 1_000_000
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def object_versions(model, pks):
+    """{pk: version} for many objects in one cache round trip"""
+    keys = {_version_key(model, pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, pk in keys.items():
+        if key not in found:
+            versions[pk] = object_version(model, pk)
+    return versions
+
+
+def bump_object_version(model, pk):
+    """Invalidate every entry cached for (model, pk)"""
+    if pk is None:
+        return
+    current = cache.get(_version_key(model, pk)) or 0
+    cache.set(_version_key(model, pk), max(time.time_ns() // 1_000_000, current + 1), VERSION_TIMEOUT)
+
+
+def object_key(model, pk, part='object'):
+    return f'obj:{_label(model)}:{pk}:v{object_version(model, pk)}:{part}'
+
+
+def cached_for_object(model, pk, part, build, timeout=OBJECT_CACHE_TIMEOUT):
+    """Read-through: return the cached `part` of (model, pk), building it on a miss"""
+    key = object_key(model, pk, part)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+# ========== READ-THROUGH HELPERS ==========
+
+def get_profile_user(username):
+    """User with profile for a profile page (404 if missing)"""
+    users = User.objects.select_related('profile').defer(*private_user_fields())
+    user_id = cache.get(f'username:{username}')
+    if user_id is not None:
+        user = cached_for_object(
+            Profile, user_id, 'user',
+            lambda: users.filter(id=user_id).first() or False
+        )
+        # A renamed user keeps the old mapping until here
+        if user and user.username == username:
+            return user
+
+    user = get_object_or_404(users, username=username)
+    cache.set(f'username:{username}', user.id, VERSION_TIMEOUT)
+    cache.set(object_key(Profile, user.id, 'user'), user, OBJECT_CACHE_TIMEOUT)
+    return user
+
+
+def get_follow_counts(user):
+    """(followers, following) of a user"""
+    return cached_for_object(
+        Profile, user.id, 'follow_counts',
+        lambda: (user.followers.count(), user.following.count())
+    )
+
+
+def get_video(video_id):
+    """Video with author, profile and like_count (404 if missing)"""
+    def build():
+        return get_object_or_404(
+            Video.objects.select_related('author__profile').defer(*private_user_fields('author__')).annotate(
+                like_count=Count('video_likes')
+            ),
+            id=video_id
+        )
+    return cached_for_object(Video, video_id, 'detail', build)
+
+
+def get_group(group_id):
+    """Group with its admin (404 if missing)"""
+    return cached_for_object(
+        Group, group_id, 'object',
+        lambda: get_object_or_404(
+            Group.objects.select_related('admin').defer(*private_user_fields('admin__')), id=group_id
+        )
+    )
+
+
+def get_playlist(playlist_id):
+    """Playlist with its owner (404 if missing)"""
+    return cached_for_object(
+        Playlist, playlist_id, 'object',
+        lambda: get_object_or_404(
+            Playlist.objects.select_related('user__profile').defer(*private_user_fields('user__')), id=playlist_id
+        )
+    )
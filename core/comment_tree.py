@@ -0,0 +1,111 @@
+"""
+Threaded video comment loading.
+
+Every reply stores its thread `root` and `depth`, so a page of threads
+(top-level comments plus their first replies, up to a maximum depth) is
+loaded in a fixed number of queries instead of one query per thread level:
+
+  1. count of top-level comments (pagination)
+  2. page of top-level comments with per-thread reply counts
+  3. first N replies of every thread on the page (window function)
+
+Further replies of a thread are fetched with `load_thread_replies`, in the
+same depth-first order.
+"""
+from collections import defaultdict
+
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import VideoComment
+
+COMMENTS_PER_PAGE = 20
+REPLIES_PER_THREAD = 3
+MAX_REPLY_DEPTH = 3
+
+
+def _order_thread(root_id, replies):
+    """Return replies in display order (depth-first, oldest first)"""
+    children = defaultdict(list)
+    for reply in replies:
+        children[reply.parent_id].append(reply)
+
+    ordered = []
+    stack = list(reversed(children[root_id]))
+    while stack:
+        reply = stack.pop()
+        ordered.append(reply)
+        stack.extend(reversed(children[reply.id]))
+    return ordered
+
+
+def load_comment_threads(video, page=1, per_page=COMMENTS_PER_PAGE,
+                         replies_per_thread=REPLIES_PER_THREAD, max_depth=MAX_REPLY_DEPTH):
+    """
+    Return a Page of top-level comments. Each comment gets:
+      - reply_count: number of replies in the thread, up to max_depth
+      - thread_replies: its first replies, depth-first, each with `depth`
+      - more_replies: whether the thread has replies not shown yet
+    """
+    top_level = video.video_comments.filter(
+        parent=None
+    ).select_related('author__profile').annotate(
+        reply_count=Count('thread_comments', filter=Q(thread_comments__depth__lte=max_depth))
+    ).order_by('created_at')
+
+    page_obj = Paginator(top_level, per_page).get_page(page)
+    roots = list(page_obj.object_list)
+    page_obj.object_list = roots
+
+    replies_by_root = defaultdict(list)
+    if roots and replies_per_thread > 0:
+        # Replies are never older than their parent, so the first N replies of a
+        # thread by creation time always form a connected subtree.
+        replies = VideoComment.objects.filter(
+            root_id__in=[root.id for root in roots],
+            depth__lte=max_depth
+        ).select_related('author__profile').annotate(
+            thread_position=Window(
+                expression=RowNumber(),
+                partition_by=[F('root_id')],
+                order_by=[F('created_at').asc(), F('id').asc()]
+            )
+        ).filter(thread_position__lte=replies_per_thread)
+
+        for reply in replies:
+            replies_by_root[reply.root_id].append(reply)
+
+    for root in roots:
+        root.thread_replies = _order_thread(root.id, replies_by_root[root.id])
+        root.more_replies = root.reply_count > len(root.thread_replies)
+
+    return page_obj
+
+
+def load_thread_replies(root_id, offset=0, limit=REPLIES_PER_THREAD * 5, max_depth=MAX_REPLY_DEPTH):
+    """
+    Return the thread's replies `offset` to `offset + limit` by creation time,
+    in display order, and whether more remain. The first `offset` replies are
+    the ones already shown; each returned reply gets `after_id`, the reply it
+    is displayed right after (None for the first one), so a nested reply that
+    arrives after its parent's siblings still lands under its parent.
+    """
+    # Like the first page, the oldest replies always form a connected subtree
+    replies = list(
+        VideoComment.objects.filter(
+            root_id=root_id,
+            depth__lte=max_depth
+        ).select_related('author').order_by('created_at', 'id')[:offset + limit + 1]
+    )
+    has_more = len(replies) > offset + limit
+    new_ids = {reply.id for reply in replies[offset:offset + limit]}
+
+    loaded = []
+    previous = None
+    for reply in _order_thread(root_id, replies[:offset + limit]):
+        if reply.id in new_ids:
+            reply.after_id = previous
+            loaded.append(reply)
+        previous = reply.id
+    return loaded, has_more
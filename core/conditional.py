@@ -0,0 +1,165 @@
+"""
+Conditional GET for the detail pages.
+
+`conditional_page(versions)` wraps a view in Django's condition() decorator
+with validators built from the cache versions of the objects the page shows
+(core/caching.py). Versions are bumped whenever an object or anything counted
+on it (likes, comments, posts, memberships) changes, so they act as the
+page's updated_at without reading a row. The ETag hashes:
+
+  - those versions
+  - the path and query string (page numbers)
+  - the viewer: user id, CSRF cookie and unread badge counts
+  - the current VALIDATOR_WINDOW slot, so what changes without bumping a
+    version (a related video's title, "5 minutes ago") is at most that stale
+
+A matching If-None-Match gets a 304 before the view runs. Signed-in viewers
+cost the two badge counts, which the context processor then reuses (plus their
+playlist ids on video pages); anonymous
+viewers cost only cache reads and also get a Last-Modified, the newest version
+(versions are millisecond timestamps of the last change).
+
+Work that must happen on every request, such as counting a video view, goes
+in the `always` hook, which runs before the precondition check.
+"""
+import hashlib
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .caching import cached_for_object, object_versions, get_profile_user
+from .context_processors import unread_counts
+from .feed import FEED_PAGE_SIZE
+from .group_feed import group_feed_ids, parse_group_cursor
+from .models import Profile, Post, Video, Group, GroupPost, Playlist
+
+VALIDATOR_WINDOW = 60 * 5
+
+
+def _page_validators(request, versions, args, kwargs):
+    """(etag, last_modified) of the page, or None to always render it"""
+    if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+        # Flash messages must be shown, not revalidated away
+        return None
+    try:
+        objects = versions(request, *args, **kwargs)
+    except Http404:
+        return None
+    if objects is None:
+        return None
+
+    window = int(time.time() // VALIDATOR_WINDOW) * VALIDATOR_WINDOW
+    pks_by_model = defaultdict(list)
+    for model, pk in objects:
+        pks_by_model[model].append(pk)
+
+    parts = [request.path, request.GET.urlencode(), window, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')]
+    stamps = [window * 1000]
+    for model, pks in pks_by_model.items():
+        found = object_versions(model, pks)
+        parts.extend(f'{model._meta.label_lower}:{pk}:{found[pk]}' for pk in pks)
+        stamps.extend(found.values())
+
+    last_modified = None
+    if request.user.is_authenticated:
+        parts.extend([request.user.id, *unread_counts(request)])
+    else:
+        last_modified = datetime.fromtimestamp(max(stamps) / 1000, tz=dt_timezone.utc)
+
+    etag = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+    return etag, last_modified
+
+
+def conditional_page(versions, always=None):
+    """
+    Answer conditional GETs of a view with 304 when nothing it shows has changed.
+    `versions(request, *args, **kwargs)` returns the [(model, pk), ...] the page
+    is built from, or None to always render. `always(request, *args, **kwargs)`
+    runs first on every request, 304 or not.
+    """
+    def validators(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            request._page_validators = _page_validators(request, versions, args, kwargs)
+        return request._page_validators
+
+    def etag_func(request, *args, **kwargs):
+        found = validators(request, *args, **kwargs)
+        return found and found[0]
+
+    def last_modified_func(request, *args, **kwargs):
+        found = validators(request, *args, **kwargs)
+        return found and found[1]
+
+    def decorator(view):
+        conditional_view = condition(etag_func, last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if always is not None:
+                always(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            # Browsers may keep the page but must revalidate; shared caches must not
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+# ========== PAGE VERSIONS ==========
+
+def profile_versions(request, username):
+    """The profile and the posts on the requested page"""
+    user = get_profile_user(username)
+    # Same page number the view's Paginator.get_page() settles on
+    try:
+        number = int(request.GET.get('page') or 1)
+    except ValueError:
+        number = 1
+    if number < 1:
+        return None
+    start = (number - 1) * FEED_PAGE_SIZE
+    post_ids = cached_for_object(
+        Profile, user.id, f'post_ids:{number}',
+        lambda: list(
+            Post.objects.filter(author=user).order_by('-created_at').values_list('id', flat=True)[
+                start:start + FEED_PAGE_SIZE
+            ]
+        )
+    )
+    if not post_ids and number > 1:
+        # Past the end: the view falls back to the last page
+        return None
+    return [(Profile, user.id)] + [(Post, post_id) for post_id in post_ids]
+
+
+def video_versions(request, video_id):
+    """The video and the viewer's playlists, whose checkmarks and counts the page shows"""
+    objects = [(Video, video_id)]
+    if request.user.is_authenticated:
+        playlist_ids = Playlist.objects.filter(user=request.user).values_list('id', flat=True)
+        objects += [(Playlist, playlist_id) for playlist_id in playlist_ids]
+    return objects
+
+
+def group_versions(request, group_id):
+    """The group and the posts on the requested page, in group feed order"""
+    try:
+        before = parse_group_cursor(request.GET.get('before'))
+    except ValueError:
+        return None  # the view answers 400
+    pinned, post_ids = cached_for_object(
+        Group, group_id, f'feed_ids:{before}', lambda: group_feed_ids(group_id, before)
+    )
+    return [(Group, group_id)] + [(GroupPost, post_id) for post_id in pinned + post_ids]
+
+
+def playlist_versions(request, playlist_id):
+    return [(Playlist, playlist_id)]
@@ -1,19 +1,22 @@
 from .models import Message, Notification
 
+
+def unread_counts(request):
+    """(unread messages, unread notifications) of the signed-in user, counted once per request"""
+    if not hasattr(request, '_unread_counts'):
+        request._unread_counts = (
+            Message.objects.filter(recipient=request.user, is_read=False).count(),
+            Notification.objects.filter(user=request.user, is_read=False).count(),
+        )
+    return request._unread_counts
+
+
 def notifications_processor(request):
     """
     Add notification counts to all templates
     """
     if request.user.is_authenticated:
-        unread_messages_count = Message.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).count()
-        
-        unread_notifications_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
+        unread_messages_count, unread_notifications_count = unread_counts(request)
         
         return {
             'unread_messages_count': unread_messages_count,
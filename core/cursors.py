@@ -0,0 +1,41 @@
+"""
+Keyset cursors for paginated lists and APIs.
+
+A cursor carries the sort key of the last row a client saw, e.g.
+(updated_at, id), rather than just the row's id. The next page is then
+"everything after this key", which works even if that row has since been
+deleted, pinned or moved. The id is the tie-breaker, so rows sharing a
+timestamp are neither skipped nor repeated.
+
+Cursors are short strings of integers, datetimes as microseconds since the
+epoch: "1718000000123456_42".
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(*values):
+    """Cursor string for a sort key of ints and aware datetimes"""
+    return '_'.join(
+        str((value - EPOCH) // MICROSECOND) if isinstance(value, datetime) else str(int(value))
+        for value in values
+    )
+
+
+def decode_cursor(cursor, *types):
+    """
+    Sort key of a cursor, each part converted to the matching type in `types`
+    (int or datetime). Raises ValueError for malformed cursors.
+    """
+    parts = cursor.split('_')
+    if len(parts) != len(types):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    try:
+        return tuple(
+            EPOCH + int(part) * MICROSECOND if kind is datetime else kind(part)
+            for part, kind in zip(parts, types)
+        )
+    except OverflowError:
+        raise ValueError(f'Invalid cursor {cursor!r}')
@@ -0,0 +1,119 @@
+"""
+Feed page assembly.
+
+Builds one page of the home feed with everything post_card.html needs
+attached to each post, so rendering never goes back to the database:
+
+  - post.like_count / post.comment_count (correlated subqueries, no join fan-out)
+  - post.is_liked for the current user (see core/likes.py)
+  - post.author_avatar_url
+  - post.latest_comments: the newest comments, oldest first, with authors;
+    "View all N comments" loads the older ones through `older_comments`
+  - post.fragment_version / post.comments_version / post.is_own: what the
+    card's cached fragments are keyed on (see below)
+
+The number of queries is the same whatever the page size.
+
+post_card.html caches the parts of a card that are the same for every viewer
+(author, content, counts, latest comments) as template fragments keyed by
+post.fragment_version: the post's cache version (bumped on edits, likes and
+comments, see core/signals.py) joined with its author's profile version. The
+comments fragment shows the commenters' names and avatars, so its key,
+post.comments_version, also carries each shown commenter's profile version
+(bumped when the profile or the user is saved). The viewer-specific bits, the like button and the comment box, stay outside the
+fragments, so a page re-renders only the cards whose content changed.
+Timestamps inside a fragment ("5 minutes ago") may lag by up to
+FRAGMENT_CACHE_TIMEOUT.
+"""
+from django.core.paginator import Paginator
+from django.db.models import (
+    Count, IntegerField, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+)
+from django.db.models.functions import Coalesce
+
+from .models import Post, Profile, Like, Comment
+from .likes import mark_liked_posts
+from .caching import object_versions
+
+FEED_PAGE_SIZE = 20
+LATEST_COMMENTS = 3
+OLDER_COMMENTS_PAGE_SIZE = 50
+FRAGMENT_CACHE_TIMEOUT = 60 * 5
+# The feed sidebar's suggestions, per viewer; follows invalidate it sooner
+SUGGESTIONS_CACHE_TIMEOUT = 60 * 15
+
+
+def avatar_url(user):
+    """Uploaded profile picture URL, or None so templates show the initial placeholder"""
+    profile = user.profile
+    return profile.profile_picture.url if profile.profile_picture else None
+
+
+def count_subquery(model, field='post'):
+    """Correlated COUNT(*) of `model` rows pointing at the outer post"""
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def feed_posts(user):
+    """Posts by the user and everyone they follow, newest first"""
+    following_ids = user.following.values('following')
+    return Post.objects.filter(
+        Q(author=user) | Q(author__in=following_ids)
+    ).select_related('author__profile').annotate(
+        like_count=count_subquery(Like),
+        comment_count=count_subquery(Comment),
+    ).order_by('-created_at')
+
+
+def attach_post_details(posts, latest_comments=LATEST_COMMENTS):
+    """Prefetch the latest comments of `posts` and attach the per-post view model"""
+    posts = list(posts)
+    prefetch_related_objects(posts, Prefetch(
+        'comments',
+        queryset=Comment.objects.select_related('author__profile').order_by('-created_at')[:latest_comments],
+        to_attr='newest_comments'
+    ))
+
+    for post in posts:
+        post.author_avatar_url = avatar_url(post.author)
+        post.latest_comments = post.newest_comments[::-1]
+        for comment in post.latest_comments:
+            comment.author_avatar_url = avatar_url(comment.author)
+    return posts
+
+
+def older_comments(post_id, before, limit=OLDER_COMMENTS_PAGE_SIZE):
+    """The `limit` comments of a post preceding comment `before`, oldest first, and whether more remain"""
+    comments = list(
+        Comment.objects.filter(post_id=post_id, id__lt=before).select_related(
+            'author__profile'
+        ).order_by('-id')[:limit + 1]
+    )
+    return comments[:limit][::-1], len(comments) > limit
+
+
+def attach_fragment_versions(user, posts):
+    """Set the versions post_card.html's cached fragments are keyed on, and post.is_own"""
+    post_versions = object_versions(Post, [post.id for post in posts])
+    author_versions = object_versions(Profile, {post.author_id for post in posts} | {
+        comment.author_id for post in posts for comment in post.latest_comments
+    })
+    for post in posts:
+        post.fragment_version = f'{post_versions[post.id]}.{author_versions[post.author_id]}'
+        post.comments_version = '.'.join([str(post_versions[post.id])] + [
+            str(author_versions[comment.author_id]) for comment in post.latest_comments
+        ])
+        post.is_own = post.author_id == user.id
+    return posts
+
+
+def build_feed_page(user, page=1, per_page=FEED_PAGE_SIZE, latest_comments=LATEST_COMMENTS):
+    """Return a Page of feed posts ready for post_card.html"""
+    page_obj = Paginator(feed_posts(user), per_page).get_page(page)
+    posts = attach_post_details(page_obj.object_list, latest_comments)
+    attach_fragment_versions(user, posts)
+    page_obj.object_list = mark_liked_posts(user, posts)
+    return page_obj
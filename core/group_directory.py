@@ -0,0 +1,86 @@
+"""
+Group directory.
+
+Groups carry their own member_count (approved members), post_count and
+last_activity_at (newest post, or creation), so the directory sorts and
+filters on indexed columns instead of counting the membership table for every
+group on every request. The signals in core/signals.py recompute the counters
+of a group whenever one of its memberships or posts is added or removed. That
+covers create, join, leave, approval and removal. Recomputing from the indexed
+rows rather than incrementing keeps the counters from drifting.
+
+`directory_groups` returns the queryset for one directory view: public groups
+by size or by recent activity, optionally in one category, or the viewer's own
+groups. `directory_page` slices one page of it, fetching one extra row to
+tell whether there is a next page instead of counting every public group.
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .caching import bump_object_version
+from .models import Group, GroupMembership, GroupPost
+
+GROUPS_PER_PAGE = 24
+CATEGORIES_CACHE_TIMEOUT = 60 * 10
+
+DIRECTORY_SORTS = {
+    'members': ('-member_count', '-id'),
+    'active': ('-last_activity_at', '-id'),
+}
+DEFAULT_SORT = 'members'
+
+
+def _count(queryset):
+    counts = queryset.order_by().values('group').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def refresh_group_counts(group_ids):
+    """Recompute member_count, post_count and last_activity_at of the given groups"""
+    latest_post = GroupPost.objects.filter(group=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    Group.objects.filter(pk__in=group_ids).update(
+        member_count=_count(GroupMembership.objects.filter(group=OuterRef('pk'), status='approved')),
+        post_count=_count(GroupPost.objects.filter(group=OuterRef('pk'))),
+        last_activity_at=Coalesce(Subquery(latest_post), F('created_at')),
+    )
+    for group_id in group_ids:
+        bump_object_version(Group, group_id)
+
+
+def directory_groups(user, sort=DEFAULT_SORT, category=None, mine=False):
+    """Groups for one directory view, in display order"""
+    if mine:
+        groups = Group.objects.filter(groupmembership__user=user).order_by(*DIRECTORY_SORTS['active'])
+    else:
+        groups = Group.objects.filter(privacy='public').order_by(
+            *DIRECTORY_SORTS.get(sort, DIRECTORY_SORTS[DEFAULT_SORT])
+        )
+        if category:
+            groups = groups.filter(category=category)
+    return groups.select_related('admin')
+
+
+def directory_categories():
+    """Categories of public groups, for the directory filters"""
+    return cache.get_or_set('group_directory:categories', lambda: list(
+        Group.objects.filter(privacy='public').exclude(category='').order_by('category').values_list(
+            'category', flat=True
+        ).distinct()
+    ), CATEGORIES_CACHE_TIMEOUT)
+
+
+def directory_page(groups, number, per_page=GROUPS_PER_PAGE):
+    """Return {'groups', 'number', 'has_previous', 'has_next'} for one directory page"""
+    try:
+        number = max(int(number), 1)
+    except (TypeError, ValueError):
+        number = 1
+    start = (number - 1) * per_page
+    rows = list(groups[start:start + per_page + 1])
+    return {
+        'groups': rows[:per_page],
+        'number': number,
+        'has_previous': number > 1,
+        'has_next': len(rows) > per_page,
+    }
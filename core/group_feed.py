@@ -0,0 +1,85 @@
+"""
+Group feed assembly.
+
+A group page shows the group's pinned posts first, then its other posts
+newest first, GROUP_FEED_PAGE_SIZE at a time. The stream is keyset-paginated:
+?before=<cursor> continues after the (created_at, id) of the last post shown
+(core/cursors.py), so a deep page costs the same as the first one, new posts
+never shift what a reader is paging through, and deleting or pinning that
+post does not break the next page.
+
+Like and comment counts are denormalized onto GroupPost (kept up to date by
+the signals in core/signals.py) and the viewer's liked flags for the whole
+page come from one query, so a page takes the same number of queries
+whatever its size.
+"""
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+
+from .cursors import encode_cursor, decode_cursor
+from .models import GroupPost, GroupPostLike
+
+GROUP_FEED_PAGE_SIZE = 20
+
+
+def mark_liked_group_posts(user, posts):
+    """Set post.is_liked for every post in one query"""
+    liked = set(GroupPostLike.objects.filter(
+        user=user, post_id__in=[post.id for post in posts]
+    ).values_list('post_id', flat=True))
+    for post in posts:
+        post.is_liked = post.id in liked
+    return posts
+
+
+def parse_group_cursor(before):
+    """Canonical form of a ?before= cursor (None for the first page); raises ValueError if malformed"""
+    if not before:
+        return None
+    return encode_cursor(*decode_cursor(before, datetime, int))
+
+
+def _pinned(group_id):
+    return GroupPost.objects.filter(group_id=group_id, is_pinned=True).order_by('-created_at', '-id')
+
+
+def _stream(group_id, before):
+    """Unpinned posts after the `before` cursor, newest first"""
+    stream = GroupPost.objects.filter(group_id=group_id, is_pinned=False).order_by('-created_at', '-id')
+    if before is not None:
+        try:
+            created_at, pk = decode_cursor(before, datetime, int)
+        except ValueError:
+            raise Http404('Invalid group feed cursor')
+        stream = stream.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return stream
+
+
+def group_feed_ids(group_id, before=None, per_page=GROUP_FEED_PAGE_SIZE):
+    """(pinned ids, post ids) of one page of the feed, as build_group_feed would show it"""
+    pinned = [] if before is not None else list(_pinned(group_id).values_list('id', flat=True))
+    return pinned, list(_stream(group_id, before).values_list('id', flat=True)[:per_page])
+
+
+def build_group_feed(group, user, before=None, per_page=GROUP_FEED_PAGE_SIZE):
+    """
+    Return {'pinned', 'posts', 'has_more', 'next_before'} for one page of a
+    group's feed; pinned posts only come with the first page.
+    """
+    pinned = []
+    if before is None:
+        pinned = list(_pinned(group.id).select_related('author__profile'))
+
+    posts = list(_stream(group.id, before).select_related('author__profile')[:per_page + 1])
+    has_more = len(posts) > per_page
+    posts = posts[:per_page]
+
+    mark_liked_group_posts(user, pinned + posts)
+    return {
+        'pinned': pinned,
+        'posts': posts,
+        'has_more': has_more,
+        'next_before': encode_cursor(posts[-1].created_at, posts[-1].id) if has_more else None,
+    }
@@ -0,0 +1,31 @@
+"""
+Partial indexes that degrade sensibly on MySQL.
+
+The hot-path indexes only cover rows matching a filter (unread messages,
+public videos). PostgreSQL and SQLite build them as partial indexes, which is
+also what their planners match `WHERE NOT is_read` / `WHERE is_public`
+against. MySQL has no index conditions and Django would silently build the
+index without its WHERE clause, so there the filter column is made a key
+column instead (`fallback_fields`).
+"""
+from django.db import models
+
+
+class PartialIndex(models.Index):
+    """Index with a condition, or a composite of `fallback_fields` where conditions are unsupported"""
+
+    def __init__(self, *args, fallback_fields=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fallback_fields = list(fallback_fields)
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.features.supports_partial_indexes or not self.fallback_fields:
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        fallback = models.Index(fields=self.fallback_fields, name=self.name, db_tablespace=self.db_tablespace)
+        return fallback.create_sql(model, schema_editor, using=using, **kwargs)
+
+    def deconstruct(self):
+        path, args, kwargs = super().deconstruct()
+        if self.fallback_fields:
+            kwargs['fallback_fields'] = self.fallback_fields
+        return path, args, kwargs
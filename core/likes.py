@@ -0,0 +1,68 @@
+"""
+Liked-post lookups for the heart icons on feed and profile pages.
+
+A page only needs to know which of its ~20 posts the viewer liked, so the
+old approach of loading the user's whole like history does not scale. The
+ids of each user's most recent likes are cached as a set: if the user has
+fewer likes than the cap the set is complete and answers every lookup,
+otherwise only the page's unknown post ids are checked in the database.
+
+The cached set is dropped whenever one of the user's likes is added or
+removed (like_post, admin, fixtures...) by the Like signals in core/signals.py.
+"""
+from django.core.cache import cache
+
+from .models import Like
+
+RECENT_LIKES_LIMIT = 1000
+LIKED_POSTS_TIMEOUT = 60 * 60
+
+
+def _cache_key(user_id):
+    return f'liked_posts:{user_id}'
+
+
+def recent_liked_post_ids(user_id):
+    """Return (ids of the user's most recent likes, whether that is all of them)"""
+    key = _cache_key(user_id)
+    cached = cache.get(key)
+    if cached is None:
+        ids = list(
+            Like.objects.filter(user_id=user_id).order_by('-created_at').values_list(
+                'post_id', flat=True
+            )[:RECENT_LIKES_LIMIT + 1]
+        )
+        cached = (frozenset(ids[:RECENT_LIKES_LIMIT]), len(ids) <= RECENT_LIKES_LIMIT)
+        cache.set(key, cached, LIKED_POSTS_TIMEOUT)
+    return cached
+
+
+def liked_post_ids(user, post_ids):
+    """Return the subset of `post_ids` the user has liked"""
+    if not user.is_authenticated:
+        return set()
+
+    post_ids = set(post_ids)
+    if not post_ids:
+        return set()
+
+    recent_ids, complete = recent_liked_post_ids(user.id)
+    liked = post_ids & recent_ids
+    unknown = post_ids - recent_ids
+    if unknown and not complete:
+        liked.update(
+            Like.objects.filter(user=user, post_id__in=unknown).values_list('post_id', flat=True)
+        )
+    return liked
+
+
+def mark_liked_posts(user, posts):
+    """Set `is_liked` on each post of a page"""
+    liked = liked_post_ids(user, [post.id for post in posts])
+    for post in posts:
+        post.is_liked = post.id in liked
+    return posts
+
+
+def invalidate_liked_posts(user_id):
+    cache.delete(_cache_key(user_id))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from core.benchmarks import run_benchmarks, compare_results, ENDPOINTS, ITERATIONS, WARMUP, TOLERANCE
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the key views (latency, queries, allocations) and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoints', nargs='*', choices=[[]] + list(ENDPOINTS), help='Endpoints to run (default: all)')
+        parser.add_argument('--iterations', type=int, default=ITERATIONS, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=WARMUP, help='Untimed requests per endpoint')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Results file to compare against; exits with an error on regressions')
+        parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='Allowed slowdown, e.g. 0.2 for 20%%')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["baseline"]}: {e}')
+
+        self.stdout.write(f'⏱️  Benchmarking ({options["iterations"]} iterations{", cold cache" if options["cold"] else ""})')
+        try:
+            results = run_benchmarks(
+                names=options['endpoints'] or None,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                cold=options['cold'],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(f'💾 Results written to {options["output"]}')
+
+        if baseline is None:
+            return
+        regressions = compare_results(results, baseline, options['tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'   ❌ {regression}'))
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS(f'✅ No regressions against {options["baseline"]}'))
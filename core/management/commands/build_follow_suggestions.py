@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from core.models import Profile
+from core.suggestions import refresh_follow_suggestions, SUGGESTIONS_LIMIT
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the who-to-follow suggestions (only stale users unless --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every user, not just stale ones')
+        parser.add_argument('--limit', type=int, default=SUGGESTIONS_LIMIT, help='Suggestions kept per user')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Profile.objects.update(suggestions_stale=True)
+
+        self.stdout.write('👥 Building follow suggestions...')
+        refreshed = refresh_follow_suggestions(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Refreshed {refreshed} user(s)'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from core.models import Video
+from core.related_videos import refresh_related_videos, RELATED_VIDEOS_LIMIT
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related videos index (only stale videos unless --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every video, not just stale ones')
+        parser.add_argument('--limit', type=int, default=RELATED_VIDEOS_LIMIT, help='Neighbours kept per video')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Video.objects.update(related_stale=True)
+
+        self.stdout.write('🎬 Building related videos index...')
+        refreshed = refresh_related_videos(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Refreshed {refreshed} video(s)'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.stories import flush_story_views
+
+
+class Command(BaseCommand):
+    help = 'Write the queued story views to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0, help='Keep running, flushing every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            written = flush_story_views()
+            self.stdout.write(self.style.SUCCESS(
+                f'👀 Wrote {written} story view(s) in {time.monotonic() - started:.2f}s'
+            ))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.synthetic import generate_dataset, delete_dataset, SYNTHETIC_PREFIX, SYNTHETIC_PASSWORD, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic social graph for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Number of users (about 100 rows each)')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply the per-user activity rates')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; same seed, same dataset')
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many days')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per bulk insert')
+        parser.add_argument('--prefix', default=SYNTHETIC_PREFIX, help='Username prefix of the synthetic users')
+        parser.add_argument('--clear', action='store_true', help='Delete an existing dataset with this prefix first')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=f'{prefix}_').exists()
+        if existing and not options['clear']:
+            raise CommandError(f'A dataset with prefix "{prefix}" exists; use --clear to replace it')
+
+        if existing:
+            started = time.monotonic()
+            deleted = delete_dataset(prefix, options['batch_size'])
+            self.stdout.write(f'🗑️  Deleted {deleted} row(s) in {time.monotonic() - started:.1f}s')
+
+        self.stdout.write(f'🏗️  Generating {options["users"]} users (seed {options["seed"]}, scale {options["scale"]})')
+        started = time.monotonic()
+        counts = generate_dataset(
+            users=options['users'],
+            seed=options['seed'],
+            prefix=prefix,
+            batch_size=options['batch_size'],
+            days=options['days'],
+            scale=options['scale'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Created {sum(counts.values())} row(s) in {time.monotonic() - started:.1f}s '
+            f'(log in as {prefix}_0 ... {prefix}_{options["users"] - 1} / {SYNTHETIC_PASSWORD})'
+        ))
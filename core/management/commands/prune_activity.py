@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.retention import apply_retention, drop_archive_tables, use_archive_tables, PRUNE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Apply the retention policies to notifications and story views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE, help='Rows removed per transaction')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop each policy after this many batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows past their TTL')
+        parser.add_argument(
+            '--drop-archives-after', type=int, default=None, metavar='MONTHS',
+            help='PostgreSQL: drop monthly archive tables older than this many months'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        mode = 'archive tables' if use_archive_tables() else 'chunked deletes'
+        self.stdout.write(f'🗄️  Applying retention ({mode}{", dry run" if options["dry_run"] else ""})')
+
+        results = apply_retention(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            dry_run=options['dry_run'],
+        )
+        for result in results:
+            self.stdout.write(
+                f'   {result["policy"]:<28} {result["rows"]:>8} row(s) '
+                f'in {result["batches"]} batch(es), {result["seconds"]:.2f}s'
+            )
+
+        if options['drop_archives_after'] is not None and not options['dry_run']:
+            for table in drop_archive_tables(options['drop_archives_after']):
+                self.stdout.write(f'   🗑️  Dropped {table}')
+
+        total = sum(result['rows'] for result in results)
+        action = 'Would prune' if options['dry_run'] else 'Pruned'
+        self.stdout.write(self.style.SUCCESS(
+            f'🧹 {action} {total} row(s) in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.stories import sweep_expired_stories, SWEEP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Archive (or delete) expired stories that are not in a highlight'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete expired stories instead of archiving them')
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Stories moved per transaction')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--interval', type=int, default=0, help='Keep running, sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            swept = sweep_expired_stories(
+                archive=not options['delete'],
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            action = 'Deleted' if options['delete'] else 'Archived'
+            self.stdout.write(self.style.SUCCESS(
+                f'🧹 {action} {swept} expired story(ies) in {time.monotonic() - started:.2f}s'
+            ))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
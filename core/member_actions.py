@@ -0,0 +1,141 @@
+"""
+Bulk group membership operations.
+
+Moderators approve pending joiners and remove members, and the group admin
+promotes and demotes moderators, for many users at once. Each operation runs in
+one transaction and costs a fixed number of queries per MEMBER_BATCH_SIZE users:
+
+  - role and status changes are a single UPDATE (every row gets the same
+    value) rather than a save() per membership
+  - removals are one queryset delete() per batch (memberships have no
+    dependent rows); the membership receivers in core/signals.py skip rows
+    deleted inside `handled_per_batch()`, as their work is done once per batch
+  - Group.moderators is kept in sync through its through table with one
+    bulk INSERT or DELETE instead of an add()/remove() per user
+
+UPDATE sends no model signals either, so the operations themselves invalidate
+the cached memberships (core/memberships.py), flag the users' follow
+suggestions as stale when their groups change, and recount the group or bump
+its version. The group admin's own membership is never touched.
+
+Every operation returns the ids of the users it changed.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .caching import bump_object_version
+from .group_directory import refresh_group_counts
+from .memberships import invalidate_memberships
+from .models import Group, GroupMembership
+from .suggestions import mark_suggestions_stale
+
+MEMBER_BATCH_SIZE = 500
+
+_batch_state = threading.local()
+
+
+@contextmanager
+def handled_per_batch():
+    """Within the block (and this thread), membership delete signals leave their work to the caller"""
+    _batch_state.active = True
+    try:
+        yield
+    finally:
+        _batch_state.active = False
+
+
+def in_batch_operation():
+    return getattr(_batch_state, 'active', False)
+
+
+def _batches(user_ids):
+    user_ids = sorted(set(user_ids))
+    for start in range(0, len(user_ids), MEMBER_BATCH_SIZE):
+        yield user_ids[start:start + MEMBER_BATCH_SIZE]
+
+
+def _memberships(group, user_ids, **filters):
+    return GroupMembership.objects.filter(group=group, user_id__in=user_ids, **filters).exclude(
+        user_id=group.admin_id
+    )
+
+
+def _update(group, user_ids, filters, **values):
+    changed = []
+    for batch in _batches(user_ids):
+        rows = _memberships(group, batch, **filters)
+        ids = list(rows.values_list('user_id', flat=True))
+        if ids:
+            GroupMembership.objects.filter(group=group, user_id__in=ids).update(**values)
+            changed += ids
+    if changed:
+        invalidate_memberships(changed, group.id)
+    return changed
+
+
+@transaction.atomic
+def approve_members(group, user_ids):
+    """Approve the pending join requests of `user_ids`"""
+    approved = _update(group, user_ids, {'status': 'pending'}, status='approved')
+    if approved:
+        mark_suggestions_stale(approved)
+        refresh_group_counts([group.id])
+    return approved
+
+
+@transaction.atomic
+def remove_members(group, user_ids):
+    """Remove `user_ids` from the group, whatever their status"""
+    Moderators = Group.moderators.through
+    removed = []
+    for batch in _batches(user_ids):
+        rows = _memberships(group, batch)
+        ids = list(rows.values_list('user_id', flat=True))
+        if ids:
+            with handled_per_batch():
+                rows.delete()
+            Moderators.objects.filter(group_id=group.id, user_id__in=ids).delete()
+            invalidate_memberships(ids, group.id)
+            mark_suggestions_stale(ids)
+            removed += ids
+    if removed:
+        refresh_group_counts([group.id])
+    return removed
+
+
+@transaction.atomic
+def promote_moderators(group, user_ids):
+    """Make the approved members among `user_ids` moderators"""
+    Moderators = Group.moderators.through
+    promoted = _update(group, user_ids, {'status': 'approved', 'role': 'member'}, role='moderator')
+    for batch in _batches(promoted):
+        Moderators.objects.bulk_create(
+            [Moderators(group_id=group.id, user_id=user_id) for user_id in batch],
+            ignore_conflicts=True
+        )
+    if promoted:
+        bump_object_version(Group, group.id)
+    return promoted
+
+
+@transaction.atomic
+def demote_moderators(group, user_ids):
+    """Turn the moderators among `user_ids` back into members"""
+    Moderators = Group.moderators.through
+    demoted = _update(group, user_ids, {'role': 'moderator'}, role='member')
+    for batch in _batches(demoted):
+        Moderators.objects.filter(group_id=group.id, user_id__in=batch).delete()
+    if demoted:
+        bump_object_version(Group, group.id)
+    return demoted
+
+
+# action name: (operation, admin only, past tense for messages)
+MEMBER_ACTIONS = {
+    'approve': (approve_members, False, 'approved'),
+    'remove': (remove_members, False, 'removed'),
+    'promote': (promote_moderators, True, 'promoted to moderator'),
+    'demote': (demote_moderators, True, 'demoted to member'),
+}
@@ -0,0 +1,117 @@
+"""
+Group membership and role resolution.
+
+Group views keep asking the same two questions about the current user: are
+they an approved member, and are they a moderator or admin. `get_membership`
+answers both from one (role, status) pair per (user, group), memoized on the
+request and cached across requests. `get_memberships` resolves many groups at
+once for listing pages: one cache round trip plus one query for the misses.
+
+Display paths (group pages, member lists, the post form) use the cached pair.
+Views that change data (saving a group edit or a post, deleting posts,
+member management) use `check_membership`, which reads the row and
+refreshes the cached pair and the request memo with it. The cache is shared
+(redis in production), but it still drops writes that change rows with
+queryset.update() and forget to invalidate, and a read racing a change can
+cache the old row, so a permission to write is never taken from it.
+
+Signals in core/signals.py drop the cached pair whenever the membership row is
+saved or deleted (join, leave, approval, promotion, removal); code changing
+rows with queryset.update() must call `invalidate_memberships` itself.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from .models import GroupMembership
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
+
+class Membership(namedtuple('Membership', ['role', 'status'])):
+    """A user's role and status in a group; false when they have no membership row"""
+    __slots__ = ()
+
+    @property
+    def is_member(self):
+        return self.status == 'approved'
+
+    @property
+    def is_moderator(self):
+        return self.role in ('admin', 'moderator')
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __bool__(self):
+        return self.status is not None
+
+
+NOT_A_MEMBER = Membership(None, None)
+
+
+def _cache_key(user_id, group_id):
+    return f'membership:{user_id}:{group_id}'
+
+
+def _request_memo(request):
+    if not hasattr(request, '_memberships'):
+        request._memberships = {}
+    return request._memberships
+
+
+def get_memberships(request, group_ids):
+    """{group_id: Membership} of the current user for each of `group_ids`"""
+    user_id = request.user.id
+    memo = _request_memo(request)
+    found = {group_id: memo[group_id] for group_id in group_ids if group_id in memo}
+
+    missing = [group_id for group_id in group_ids if group_id not in found]
+    if missing:
+        keys = {_cache_key(user_id, group_id): group_id for group_id in missing}
+        for key, value in cache.get_many(keys).items():
+            found[keys[key]] = Membership(*value)
+
+        missing = [group_id for group_id in missing if group_id not in found]
+        if missing:
+            rows = {
+                group_id: Membership(role, status)
+                for group_id, role, status in GroupMembership.objects.filter(
+                    user_id=user_id, group_id__in=missing
+                ).values_list('group_id', 'role', 'status')
+            }
+            loaded = {group_id: rows.get(group_id, NOT_A_MEMBER) for group_id in missing}
+            cache.set_many(
+                {_cache_key(user_id, group_id): tuple(value) for group_id, value in loaded.items()},
+                MEMBERSHIP_CACHE_TIMEOUT
+            )
+            found.update(loaded)
+
+    memo.update(found)
+    return found
+
+
+def get_membership(request, group_id):
+    """The current user's Membership in a group"""
+    return get_memberships(request, [group_id])[group_id]
+
+
+def check_membership(request, group_id):
+    """The current user's Membership in a group, read from the database for views that write"""
+    checked = getattr(request, '_checked_memberships', None)
+    if checked is None:
+        checked = request._checked_memberships = {}
+    if group_id not in checked:
+        row = GroupMembership.objects.filter(
+            user_id=request.user.id, group_id=group_id
+        ).values_list('role', 'status').first()
+        membership = Membership(*row) if row else NOT_A_MEMBER
+        cache.set(_cache_key(request.user.id, group_id), tuple(membership), MEMBERSHIP_CACHE_TIMEOUT)
+        _request_memo(request)[group_id] = checked[group_id] = membership
+    return checked[group_id]
+
+
+def invalidate_memberships(user_ids, group_id):
+    """Drop the cached memberships of `user_ids` in a group"""
+    cache.delete_many([_cache_key(user_id, group_id) for user_id in user_ids])
@@ -0,0 +1,54 @@
+import logging
+import time
+
+from django.conf import settings
+
+from .query_budget import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = 0.5
+QUERY_BUDGET = 50
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries and SQL time of every request, log requests over budget
+    and probable N+1 loops, and in DEBUG report them in X-Query-* headers.
+
+    Recording keeps every statement of the request, so it only runs in DEBUG
+    or when QUERY_BUDGET_ENABLED is set (e.g. on a staging copy); otherwise
+    requests pass straight through.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'QUERY_BUDGET', QUERY_BUDGET)
+        self.slow_request = getattr(settings, 'SLOW_REQUEST_SECONDS', SLOW_REQUEST_SECONDS)
+
+    def __call__(self, request):
+        if not (settings.DEBUG or getattr(settings, 'QUERY_BUDGET_ENABLED', False)):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        repeated = recorder.repeated()
+        if repeated:
+            sql, times = next(iter(repeated.items()))
+            logger.warning(f"⚠️ Probable N+1 on {request.path}: {times}x {sql[:200]}")
+        if recorder.count > self.query_budget or elapsed > self.slow_request:
+            logger.warning(
+                f"⚠️ {request.method} {request.path}: {recorder.count} queries, "
+                f"{recorder.total_time * 1000:.1f}ms SQL, {elapsed * 1000:.1f}ms total"
+            )
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f'{recorder.total_time * 1000:.1f}'
+            response['X-Request-Time-Ms'] = f'{elapsed * 1000:.1f}'
+            if repeated:
+                response['X-Query-N-Plus-One'] = str(len(repeated))
+        return response
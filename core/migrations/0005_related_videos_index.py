@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-19 09:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_group_options_alter_grouppost_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='related_stale',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='RelatedVideo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.video')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='core.video')),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedvideo',
+            index=models.Index(fields=['video', '-score'], name='core_relvid_video_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedvideo',
+            unique_together={('video', 'related')},
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-19 09:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_threads(apps, schema_editor):
+    """Set root/depth on existing replies by walking up their parent chain"""
+    VideoComment = apps.get_model('core', 'VideoComment')
+    parents = dict(VideoComment.objects.values_list('id', 'parent_id'))
+
+    updates = []
+    for comment_id, parent_id in parents.items():
+        if parent_id is None:
+            continue
+        root_id, depth = comment_id, 0
+        while parents.get(root_id):
+            root_id = parents[root_id]
+            depth += 1
+        updates.append(VideoComment(id=comment_id, root_id=root_id, depth=depth))
+
+    VideoComment.objects.bulk_update(updates, ['root', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_related_videos_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videocomment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='videocomment',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='core.videocomment'),
+        ),
+        migrations.AddIndex(
+            model_name='videocomment',
+            index=models.Index(fields=['video', 'parent', 'created_at'], name='core_vidcomment_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videocomment',
+            index=models.Index(fields=['root', 'created_at'], name='core_vidcomment_thread_idx'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_video_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['author', 'expires_at'], name='core_story_author_expiry_idx'),
+        ),
+    ]
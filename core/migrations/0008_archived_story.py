@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-19 09:46
+
+import cloudinary.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0007_story_author_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedStory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('image', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='story_images')),
+                ('video', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='story_videos')),
+                ('caption', models.CharField(blank=True, max_length=200)),
+                ('duration', models.IntegerField(default=5)),
+                ('background_color', models.CharField(default='#000000', max_length=200)),
+                ('view_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_stories', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived stories',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedstory',
+            index=models.Index(fields=['author', '-created_at'], name='core_archstory_author_idx'),
+        ),
+    ]
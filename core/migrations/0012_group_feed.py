@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-19 10:29
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    GroupPost = apps.get_model('core', 'GroupPost')
+    for related, field in (('GroupPostLike', 'like_count'), ('GroupPostComment', 'comment_count')):
+        counts = apps.get_model('core', related).objects.filter(
+            post=models.OuterRef('pk')
+        ).order_by().values('post').annotate(total=models.Count('pk')).values('total')
+        GroupPost.objects.update(**{
+            field: Coalesce(models.Subquery(counts, output_field=models.IntegerField()), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grouppost',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grouppost',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='grouppost',
+            index=models.Index(fields=['group', 'is_pinned', '-created_at', '-id'], name='core_grouppost_feed_idx'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-19 10:32
+
+from django.db import migrations, models
+import django.utils.timezone
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Group = apps.get_model('core', 'Group')
+    GroupMembership = apps.get_model('core', 'GroupMembership')
+    GroupPost = apps.get_model('core', 'GroupPost')
+
+    def count(queryset):
+        totals = queryset.order_by().values('group').annotate(total=models.Count('pk')).values('total')
+        return Coalesce(models.Subquery(totals, output_field=models.IntegerField()), 0)
+
+    latest_post = GroupPost.objects.filter(group=models.OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    Group.objects.update(
+        member_count=count(GroupMembership.objects.filter(group=models.OuterRef('pk'), status='approved')),
+        post_count=count(GroupPost.objects.filter(group=models.OuterRef('pk'))),
+        last_activity_at=Coalesce(models.Subquery(latest_post), models.F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_group_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['privacy', '-member_count', '-id'], name='core_group_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['privacy', '-last_activity_at', '-id'], name='core_group_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['privacy', 'category', '-member_count', '-id'], name='core_group_category_idx'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
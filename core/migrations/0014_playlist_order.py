@@ -0,0 +1,75 @@
+# Generated by Django 4.2 on 2026-10-19 16:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+POSITION_GAP = 1 << 16
+
+
+def backfill_positions(apps, schema_editor):
+    PlaylistVideo = apps.get_model('core', 'PlaylistVideo')
+    entries, playlist_id, position = [], None, 0
+    for entry in PlaylistVideo.objects.order_by('playlist_id', 'id').only('id', 'playlist_id'):
+        if entry.playlist_id != playlist_id:
+            playlist_id, position = entry.playlist_id, 0
+        position += POSITION_GAP
+        entry.position = position
+        entries.append(entry)
+    PlaylistVideo.objects.bulk_update(entries, ['position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_group_directory'),
+    ]
+
+    operations = [
+        # The existing auto-created M2M table becomes the through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PlaylistVideo',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.playlist')),
+                        ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.video')),
+                    ],
+                    options={
+                        'db_table': 'core_playlist_videos',
+                        'unique_together': {('playlist', 'video')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='playlist',
+                    name='videos',
+                    field=models.ManyToManyField(blank=True, related_name='playlists', through='core.PlaylistVideo', to='core.video'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='playlistvideo',
+            name='position',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='playlistvideo',
+            name='added_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterModelOptions(
+            name='playlistvideo',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='playlistvideo',
+            index=models.Index(fields=['playlist', 'position', 'id'], name='core_playlist_order_idx'),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+        migrations.AlterModelTable(
+            name='playlistvideo',
+            table=None,
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-19 11:25
+
+import core.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_playlist_order'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='core_msg_unread_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='core_notif_unread_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='core_video_category_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='core_video_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=core.indexes.PartialIndex(condition=models.Q(('is_read', False)), fallback_fields=['recipient', 'is_read', 'sender'], fields=['recipient', 'sender'], name='core_msg_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=core.indexes.PartialIndex(condition=models.Q(('is_read', False)), fallback_fields=['user', 'is_read', 'notification_type', 'updated_at'], fields=['user', 'notification_type', 'updated_at'], name='core_notif_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=core.indexes.PartialIndex(condition=models.Q(('is_public', True)), fallback_fields=['is_public', 'category', '-created_at'], fields=['category', '-created_at'], name='core_video_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=core.indexes.PartialIndex(condition=models.Q(('is_public', True)), fallback_fields=['is_public', 'created_at', 'views'], fields=['created_at', 'views'], name='core_video_recent_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 
+from .indexes import PartialIndex
+
 try:
     from cloudinary.models import CloudinaryField
 except ImportError:
@@ -20,6 +22,8 @@ class Profile(models.Model):
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(blank=True)
     birth_date = models.DateField(null=True, blank=True)
+    # Set when follows or group memberships change; cleared by build_follow_suggestions
+    suggestions_stale = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -60,6 +64,31 @@ class Follow(models.Model):
         return f"{self.follower.username} follows {self.following.username}"
 
 
+class FollowSuggestion(models.Model):
+    """Precomputed top-K accounts to follow (see core/suggestions.py)"""
+    REASON_CHOICES = [
+        ('network', 'Followed by people you follow'),
+        ('groups', 'In your groups'),
+        ('popular', 'Popular on UniVerse'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='popular')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['user', '-score'], name='core_followsugg_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested.username} suggested to {self.user.username} ({self.score:.2f})"
+
+
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField(max_length=5000)
@@ -114,6 +143,16 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread badge and marking a conversation read
+            PartialIndex(
+                fields=['recipient', 'sender'],
+                condition=models.Q(is_read=False),
+                fallback_fields=['recipient', 'is_read', 'sender'],
+                name='core_msg_unread_idx'
+            ),
+            models.Index(fields=['sender', 'recipient', 'created_at'], name='core_msg_thread_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} to {self.recipient.username}"
@@ -128,14 +167,29 @@ class Notification(models.Model):
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Most recent actor; grouped notifications also keep a count and a small sample
     actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='actions')
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_sample = models.JSONField(default=list, blank=True)
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True)
+    video = models.ForeignKey('Video', on_delete=models.CASCADE, null=True, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-updated_at']
+        indexes = [
+            # Unread badge and notify() grouping
+            PartialIndex(
+                fields=['user', 'notification_type', 'updated_at'],
+                condition=models.Q(is_read=False),
+                fallback_fields=['user', 'is_read', 'notification_type', 'updated_at'],
+                name='core_notif_unread_idx'
+            ),
+            models.Index(fields=['user', '-updated_at'], name='core_notif_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.notification_type} by {self.actor.username}"
@@ -157,6 +211,9 @@ class Story(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Stories'
+        indexes = [
+            models.Index(fields=['author', 'expires_at'], name='core_story_author_expiry_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -168,6 +225,31 @@ class Story(models.Model):
 
         
 
+class ArchivedStory(models.Model):
+    """Expired stories moved out of the hot Story table by sweep_expired_stories"""
+    original_id = models.BigIntegerField(unique=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_stories')
+    image = CloudinaryField('story_images', blank=True, null=True)
+    video = CloudinaryField('story_videos', resource_type='video', blank=True, null=True)
+    caption = models.CharField(max_length=200, blank=True)
+    duration = models.IntegerField(default=5)
+    background_color = models.CharField(max_length=200, default='#000000')
+    view_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Archived stories'
+        indexes = [
+            models.Index(fields=['author', '-created_at'], name='core_archstory_author_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived story {self.original_id} by {self.author.username}"
+
+
 class StoryView(models.Model):
     """Track who viewed each story"""
     story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='views')
@@ -223,9 +305,34 @@ class Video(models.Model):
     tags = models.CharField(max_length=200, blank=True)
     is_public = models.BooleanField(default=True)
     allow_comments = models.BooleanField(default=True)
+    # Set whenever tags, likes or playlists change; cleared by build_related_videos
+    related_stale = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Listings only ever show public videos
+            PartialIndex(
+                fields=['category', '-created_at'],
+                condition=models.Q(is_public=True),
+                fallback_fields=['is_public', 'category', '-created_at'],
+                name='core_video_category_idx'
+            ),
+            # Newest public videos and the weekly trending list
+            PartialIndex(
+                fields=['created_at', 'views'],
+                condition=models.Q(is_public=True),
+                fallback_fields=['is_public', 'created_at', 'views'],
+                name='core_video_recent_idx'
+            ),
+        ]
+
+    def increment_views(self):
+        """Bump the view counter without a read-modify-write race"""
+        Video.objects.filter(pk=self.pk).update(views=models.F('views') + 1)
+        self.views += 1
+
 
 
 class VideoLike(models.Model):
@@ -248,14 +355,47 @@ class VideoComment(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='video_comments')
     content = models.TextField(max_length=1000)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Top-level comment of the thread (null for top-level comments) and nesting level,
+    # so a whole thread can be loaded with one query (see core/comment_tree.py)
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='thread_comments')
+    depth = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['video', 'parent', 'created_at'], name='core_vidcomment_top_idx'),
+            models.Index(fields=['root', 'created_at'], name='core_vidcomment_thread_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.author.username} on {self.video.title}"
+    
+    def save(self, *args, **kwargs):
+        if self.parent_id and not self.root_id:
+            parent = self.parent
+            self.root_id = parent.root_id or parent.id
+            self.depth = parent.depth + 1
+        super().save(*args, **kwargs)
+
+
+class RelatedVideo(models.Model):
+    """Precomputed top-N neighbours of a video (see core/related_videos.py)"""
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('video', 'related')
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['video', '-score'], name='core_relvid_video_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.related.title} related to {self.video.title} ({self.score:.2f})"
 
 
 class Playlist(models.Model):
@@ -263,7 +403,7 @@ class Playlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='playlists')
     title = models.CharField(max_length=100)
     description = models.TextField(max_length=500, blank=True)
-    videos = models.ManyToManyField(Video, related_name='playlists', blank=True)
+    videos = models.ManyToManyField(Video, through='PlaylistVideo', related_name='playlists', blank=True)
     is_public = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -275,6 +415,24 @@ class Playlist(models.Model):
         return f"{self.title} by {self.user.username}"
 
 
+class PlaylistVideo(models.Model):
+    """A video's place in a playlist; positions are spaced out (see core/playlists.py)"""
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    position = models.BigIntegerField(default=0)
+    added_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('playlist', 'video')
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['playlist', 'position', 'id'], name='core_playlist_order_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Video {self.video_id} in playlist {self.playlist_id}"
+
+
 class Group(models.Model):
     """Facebook-style groups"""
     PRIVACY_CHOICES = [
@@ -295,9 +453,19 @@ class Group(models.Model):
     privacy = models.CharField(max_length=20, choices=PRIVACY_CHOICES, default='public')
     rules = models.TextField(max_length=2000, blank=True)
     category = models.CharField(max_length=50, blank=True)
+    # Maintained by signals on GroupMembership / GroupPost (see core/group_directory.py)
+    member_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['privacy', '-member_count', '-id'], name='core_group_size_idx'),
+            models.Index(fields=['privacy', '-last_activity_at', '-id'], name='core_group_activity_idx'),
+            models.Index(fields=['privacy', 'category', '-member_count', '-id'], name='core_group_category_idx'),
+        ]
 
 
 class GroupMembership(models.Model):
@@ -323,6 +491,10 @@ class GroupMembership(models.Model):
     class Meta:
         unique_together = ('user', 'group')
         ordering = ['-joined_at']
+        indexes = [
+            # (user, group) lookups already use the unique_together index
+            models.Index(fields=['group', 'status'], name='core_membership_group_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} in {self.group.name} ({self.role})"
@@ -338,9 +510,17 @@ class GroupPost(models.Model):
     image = CloudinaryField('group_post_images', blank=True, null=True)
     
     is_pinned = models.BooleanField(default=False)
+    # Maintained by signals on GroupPostLike / GroupPostComment (see core/group_feed.py)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Pinned posts, then the keyset-paginated stream of a group
+            models.Index(fields=['group', 'is_pinned', '-created_at', '-id'], name='core_grouppost_feed_idx'),
+        ]
 
 
 class GroupPostLike(models.Model):
@@ -0,0 +1,183 @@
+"""
+Notification aggregation.
+
+Views call `notify()` instead of creating a Notification per event. Events of
+the same type on the same target (post, video, or for messages the sending
+user) that arrive while the previous notification is still unread and less
+than AGGREGATION_WINDOW old are folded into it: the count goes up, the actor
+becomes the newest one and a few recent actor ids are kept as a sample for
+avatars. A viral post thus produces one row per window ("alice and 241
+others liked your post") instead of one row per like.
+
+Reading is paginated: `prepare_notifications` renders a page with a fixed
+number of queries and `mark_as_read` only touches the rows that were shown.
+The JSON API pages with (updated_at, id) cursors (core/cursors.py): older
+pages newest first, newer activity oldest first from the cursor. Since
+coalescing moves a row's updated_at forward, a cursor holds the key the
+client saw rather than a row to look up, and a coalesced row simply comes
+back as new activity.
+"""
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+from .feed import avatar_url
+from .cursors import encode_cursor, decode_cursor
+
+AGGREGATION_WINDOW = timedelta(hours=6)
+ACTOR_SAMPLE_SIZE = 3
+NOTIFICATIONS_PER_PAGE = 20
+
+VERBS = {
+    'like': 'liked your {target}',
+    'comment': 'commented on your {target}',
+    'follow': 'started following you',
+    'message': 'sent you {count_word}',
+}
+
+
+def notify(user, actor, notification_type, post=None, video=None):
+    """Record an event for `user`, merging it into a recent unread notification"""
+    if user.pk == actor.pk:
+        return None
+
+    now = timezone.now()
+    group_filter = {
+        'user': user,
+        'notification_type': notification_type,
+        'post': post,
+        'video': video,
+        'is_read': False,
+        'updated_at__gte': now - AGGREGATION_WINDOW,
+    }
+    if notification_type == 'message':
+        # One thread per conversation rather than "bob and 3 others sent you a message"
+        group_filter['actor'] = actor
+
+    with transaction.atomic():
+        group = Notification.objects.select_for_update().filter(
+            **group_filter
+        ).order_by('-updated_at').first()
+
+        if group is None:
+            return Notification.objects.create(
+                user=user,
+                actor=actor,
+                notification_type=notification_type,
+                post=post,
+                video=video,
+                actor_sample=[actor.pk],
+                updated_at=now,
+            )
+
+        sample = group.actor_sample or [group.actor_id]
+        if notification_type == 'message' or actor.pk not in sample:
+            # Messages count messages; everything else counts people, so a recent
+            # actor liking again (unlike + like) or commenting twice isn't counted twice
+            group.actor_count += 1
+        group.actor = actor
+        group.actor_sample = ([actor.pk] + [pk for pk in sample if pk != actor.pk])[:ACTOR_SAMPLE_SIZE]
+        group.updated_at = now
+        group.save(update_fields=['actor', 'actor_count', 'actor_sample', 'updated_at'])
+        return group
+
+
+def describe_notification(notification):
+    """Return (message, link) for a notification, e.g. 'alice and 2 others liked your post'"""
+    others = notification.actor_count - 1
+    actors = notification.actor.username
+    if notification.notification_type == 'message':
+        others = 0
+    if others == 1:
+        actors += ' and 1 other'
+    elif others > 1:
+        actors += f' and {others} others'
+
+    verb = VERBS.get(notification.notification_type, 'interacted with you').format(
+        target='video' if notification.video_id else 'post',
+        count_word='a message' if notification.actor_count == 1 else f'{notification.actor_count} messages',
+    )
+
+    if notification.notification_type == 'follow':
+        link = f'/profile/{notification.actor.username}/'
+    elif notification.notification_type == 'message':
+        link = f'/messages/{notification.actor.username}/'
+    elif notification.video_id:
+        link = f'/video/{notification.video_id}/'
+    else:
+        link = '/'
+
+    return f'{actors} {verb}', link
+
+
+def user_notifications(user):
+    """The user's notifications, newest activity first, with what rendering needs"""
+    return user.notifications.select_related(
+        'actor__profile', 'post'
+    ).order_by('-updated_at', '-id')
+
+
+def notification_cursor(notification):
+    return encode_cursor(notification.updated_at, notification.id)
+
+
+def notifications_before(user, cursor):
+    """Notifications older than `cursor`, newest first (ValueError for a bad cursor)"""
+    updated_at, pk = decode_cursor(cursor, datetime, int)
+    return user_notifications(user).filter(
+        Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk)
+    )
+
+
+def notifications_after(user, cursor):
+    """Notifications with activity newer than `cursor`, oldest first (ValueError for a bad cursor)"""
+    updated_at, pk = decode_cursor(cursor, datetime, int)
+    return user_notifications(user).filter(
+        Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+    ).order_by('updated_at', 'id')
+
+
+def prepare_notifications(notifications):
+    """
+    Attach message, link and sample_actors to a page of notifications.
+    Sample actors for the whole page are fetched with one query.
+    """
+    notifications = list(notifications)
+
+    sample_ids = {pk for notification in notifications for pk in notification.actor_sample}
+    actors = User.objects.select_related('profile').in_bulk(sample_ids) if sample_ids else {}
+
+    for notification in notifications:
+        notification.message, notification.link = describe_notification(notification)
+        notification.sample_actors = [
+            actors[pk] for pk in notification.actor_sample if pk in actors
+        ] or [notification.actor]
+    return notifications
+
+
+def mark_as_read(notifications):
+    """Mark only the given (displayed) notifications as read"""
+    unread_ids = [notification.id for notification in notifications if not notification.is_read]
+    if unread_ids:
+        Notification.objects.filter(id__in=unread_ids).update(is_read=True)
+    return len(unread_ids)
+
+
+def serialize_notification(notification):
+    """JSON-ready dict of a prepared notification"""
+    actor = notification.actor
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'message': notification.message,
+        'link': notification.link,
+        'actor_count': notification.actor_count,
+        'actor_username': actor.username,
+        'actor_avatar': avatar_url(actor),
+        'is_read': notification.is_read,
+        'updated_at': notification.updated_at.isoformat(),
+    }
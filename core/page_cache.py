@@ -0,0 +1,101 @@
+"""
+Full-page cache for anonymous visitors.
+
+Anonymous visitors all get the same HTML, so `anonymous_page_cache` stores
+whole responses per path and page number, stamped with the cache version of
+the object the page is about (core/caching.py). For profiles that version is
+bumped by new posts, profile edits and follow changes (core/signals.py).
+
+An entry whose version is outdated, or which is older than PAGE_CACHE_FRESH,
+is stale but still served, for up to PAGE_CACHE_STALE, while a single request
+holding a short lock renders its replacement. A traffic spike on a viral
+profile then costs one render per change rather than one per visitor. Only
+when there is no entry at all does every request render.
+
+Stale responses carry validators of their own (the entry's creation time), so
+conditional GETs (core/conditional.py) never pin a client to stale content.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.utils.http import http_date
+
+from .caching import object_version, get_profile_user
+from .models import Profile
+
+PAGE_CACHE_FRESH = 60
+PAGE_CACHE_STALE = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+
+def _cacheable(request):
+    return (
+        request.method == 'GET'
+        and not request.user.is_authenticated
+        and set(request.GET) <= {'page'}
+        and not len(get_messages(request))
+    )
+
+
+def _response(entry, status):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = status
+    return response
+
+
+def anonymous_page_cache(versioned):
+    """
+    Cache a view's full response for anonymous visitors.
+    `versioned(request, *args, **kwargs)` returns the (model, pk) whose
+    version invalidates the page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                return view(request, *args, **kwargs)
+            try:
+                model, pk = versioned(request, *args, **kwargs)
+            except Http404:
+                return view(request, *args, **kwargs)
+
+            key = f'page:{request.path}:{request.GET.get("page", "1")}'
+            lock_key = f'{key}:lock'
+            version = object_version(model, pk)
+            entry = cache.get(key)
+            if entry is not None and entry['version'] == version and time.time() - entry['created'] < PAGE_CACHE_FRESH:
+                return _response(entry, 'hit')
+
+            locked = cache.add(lock_key, 1, PAGE_CACHE_LOCK_TIMEOUT)
+            if entry is not None and not locked:
+                # Another request is rendering the new version
+                response = _response(entry, 'stale')
+                response['ETag'] = '"%s"' % hashlib.md5(f'{key}:{entry["created"]}'.encode()).hexdigest()
+                response['Last-Modified'] = http_date(entry['created'])
+                return response
+
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, {
+                        'version': version,
+                        'created': time.time(),
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                    }, PAGE_CACHE_STALE)
+                    response['X-Page-Cache'] = 'miss'
+                return response
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+def profile_page_version(request, username):
+    """Profile pages are invalidated by the profile's version"""
+    return Profile, get_profile_user(username).id
@@ -0,0 +1,180 @@
+"""
+Ordered playlists.
+
+Each video in a playlist is a PlaylistVideo row with an integer position.
+Positions are spaced POSITION_GAP apart, so every edit touches one row:
+
+  - adding appends after the current last position
+  - moving takes the midpoint between the new neighbours
+  - removing deletes the row and leaves a gap
+
+Only when repeated moves into the same spot use up the space between two
+neighbours is the playlist renumbered, in one bulk update.
+
+Videos added with playlist.videos.add() (admin, shell, fixtures) are appended
+by a signal in core/signals.py, in video id order.
+
+A playlist page is read in position order, PLAYLIST_PAGE_SIZE videos at a
+time, continuing with ?after=<cursor>, the (position, entry id) of the last
+video shown (core/cursors.py), so removing that video does not break the
+next page. Videos come with their authors and
+like counts in the same query. Pages and the playlist totals are cached under
+the playlist's version, which any change to its entries bumps.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.http import Http404
+
+from .caching import cached_for_object, private_user_fields
+from .cursors import encode_cursor, decode_cursor
+from .models import Playlist, PlaylistVideo
+
+POSITION_GAP = 1 << 16
+PLAYLIST_PAGE_SIZE = 50
+
+
+def _entries(playlist_id):
+    return PlaylistVideo.objects.filter(playlist_id=playlist_id)
+
+
+def _last_position(playlist_id):
+    return _entries(playlist_id).aggregate(last=Max('position'))['last'] or 0
+
+
+def contains_video(playlist, video_id):
+    return _entries(playlist.id).filter(video_id=video_id).exists()
+
+
+def playlists_for_video(user, video):
+    """The user's playlists, each with `video_count` and `has_video` for `video`, in one query"""
+    return user.playlists.annotate(
+        video_count=Count('playlistvideo'),
+        has_video=Exists(PlaylistVideo.objects.filter(playlist=OuterRef('pk'), video=video)),
+    )
+
+
+def add_video(playlist, video):
+    """Append a video to the playlist; False if it is already there"""
+    if contains_video(playlist, video.id):
+        return False
+    try:
+        with transaction.atomic():
+            PlaylistVideo.objects.create(
+                playlist=playlist, video=video, position=_last_position(playlist.id) + POSITION_GAP
+            )
+    except IntegrityError:
+        # Added by a concurrent request
+        return False
+    return True
+
+
+def remove_video(playlist, video_id):
+    """Remove a video from the playlist; False if it was not there"""
+    entry = _entries(playlist.id).filter(video_id=video_id).first()
+    if entry is None:
+        return False
+    entry.delete()
+    return True
+
+
+def append_videos(playlist_id, video_ids):
+    """Give rows added without a position (playlist.videos.add()) places at the end"""
+    added = list(_entries(playlist_id).filter(video_id__in=video_ids).order_by('video_id'))
+    last = _entries(playlist_id).exclude(video_id__in=video_ids).aggregate(last=Max('position'))['last'] or 0
+    for index, entry in enumerate(added, 1):
+        entry.position = last + index * POSITION_GAP
+    PlaylistVideo.objects.bulk_update(added, ['position'])
+
+
+def renumber_playlist(playlist_id):
+    """Space a playlist's positions POSITION_GAP apart again, keeping the order"""
+    entries = list(_entries(playlist_id).order_by('position', 'id').only('id', 'position'))
+    for index, entry in enumerate(entries, 1):
+        entry.position = index * POSITION_GAP
+    PlaylistVideo.objects.bulk_update(entries, ['position'], batch_size=1000)
+
+
+def _position_between(lower, upper):
+    if upper is None:
+        return lower + POSITION_GAP
+    if upper - lower > 1:
+        return (lower + upper) // 2
+    return None
+
+
+@transaction.atomic
+def move_video(playlist, video_id, after_id=None):
+    """
+    Move a video to just after `after_id`, or to the top when it is None.
+    Returns False if either video is not in the playlist.
+    """
+    entry = _entries(playlist.id).select_for_update().filter(video_id=video_id).first()
+    if entry is None or after_id == video_id:
+        return False
+
+    others = _entries(playlist.id).exclude(pk=entry.pk)
+    for _ in range(2):
+        if after_id is None:
+            lower = 0
+        else:
+            lower = others.filter(video_id=after_id).values_list('position', flat=True).first()
+            if lower is None:
+                return False
+        upper = others.filter(position__gt=lower).order_by('position').values_list('position', flat=True).first()
+        position = _position_between(lower, upper)
+        if position is not None:
+            break
+        # No room left between the neighbours
+        renumber_playlist(playlist.id)
+        entry.refresh_from_db(fields=['position'])
+
+    entry.position = position
+    entry.save(update_fields=['position'])
+    return True
+
+
+# ========== READING ==========
+
+def playlist_totals(playlist):
+    """(number of videos, total views) of a playlist"""
+    def build():
+        totals = _entries(playlist.id).aggregate(count=Count('pk'), views=Sum('video__views'))
+        return totals['count'], totals['views'] or 0
+    return cached_for_object(Playlist, playlist.id, 'totals', build)
+
+
+def playlist_page(playlist, after=None, per_page=PLAYLIST_PAGE_SIZE):
+    """
+    Return {'videos', 'start', 'has_more', 'next_after'} for one page of a
+    playlist in position order; `start` is the number of videos before it.
+    """
+    def build():
+        entries = _entries(playlist.id).order_by('position', 'id')
+        start = 0
+        if after is not None:
+            try:
+                position, pk = decode_cursor(after, int, int)
+            except ValueError:
+                raise Http404('Invalid playlist cursor')
+            following = Q(position__gt=position) | Q(position=position, id__gt=pk)
+            entries = entries.filter(following)
+            start = _entries(playlist.id).exclude(following).count()
+
+        entries = list(
+            entries.select_related('video__author').defer(*private_user_fields('video__author__')).annotate(
+                like_count=Count('video__video_likes')
+            )[:per_page + 1]
+        )
+        has_more = len(entries) > per_page
+        entries = entries[:per_page]
+        videos = []
+        for entry in entries:
+            entry.video.like_count = entry.like_count
+            videos.append(entry.video)
+        return {
+            'videos': videos,
+            'start': start,
+            'has_more': has_more,
+            'next_after': encode_cursor(entries[-1].position, entries[-1].id) if has_more else None,
+        }
+    return cached_for_object(Playlist, playlist.id, f'page:{after}:{per_page}', build)
@@ -0,0 +1,93 @@
+"""
+Per-request query accounting.
+
+`QueryRecorder` hooks into every database connection with an execute wrapper
+(so it works with DEBUG off) and records, for each statement, its SQL and
+duration. Statements are grouped by fingerprint: the SQL with its parameters
+left out and IN (...) lists collapsed, so the same ORM query issued in a loop
+has one fingerprint whatever the ids. A fingerprint executed more than
+N_PLUS_ONE_THRESHOLD times in one request is reported as a probable N+1.
+
+QueryBudgetMiddleware (core/middleware.py) uses it for every request in DEBUG
+or with QUERY_BUDGET_ENABLED, and tests use
+`QueryBudgetMixin.assertQueryBudget` to pin the number of queries a view may
+issue.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+N_PLUS_ONE_THRESHOLD = 5
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def n_plus_one_threshold():
+    return getattr(settings, 'QUERY_BUDGET_N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+
+
+def fingerprint(sql):
+    """The shape of a statement: parameters are already placeholders, IN lists are collapsed"""
+    return _WHITESPACE.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """Context manager recording the queries run on every connection"""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold=None):
+        """{fingerprint: times} for statements executed more than `threshold` times"""
+        threshold = n_plus_one_threshold() if threshold is None else threshold
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {sql: times for sql, times in counts.most_common() if times > threshold}
+
+
+class QueryBudgetMixin:
+    """TestCase mixin to assert how many queries a request may take"""
+
+    def assertQueryBudget(self, max_queries, url, method='get', data=None, allow_n_plus_one=False, **extra):
+        """Request `url` and fail if it takes more than `max_queries` queries or repeats one in a loop"""
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(url, data, **extra)
+
+        statements = '\n'.join(f'  {sql}' for sql, _ in recorder.queries)
+        self.assertLessEqual(
+            recorder.count, max_queries,
+            f'{url} ran {recorder.count} queries (budget {max_queries}):\n{statements}'
+        )
+        if not allow_n_plus_one:
+            repeated = recorder.repeated()
+            self.assertFalse(repeated, f'{url} repeats queries (probable N+1): {repeated}')
+        return response
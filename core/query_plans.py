@@ -0,0 +1,112 @@
+"""
+EXPLAIN plans for the hot queries.
+
+Each entry of HOT_QUERIES rebuilds a query the way core/views.py or
+core/context_processors.py issues it, together with the indexes it is expected
+to use (added in migrations 0007, 0010 and 0015). `capture_query_plans`
+returns the database's plan for each of them so tests (and anyone checking a
+production copy from the shell) can see whether the planner actually picks
+the index.
+
+The is_read / is_public indexes are partial (core/indexes.py): Django renders
+those filters as `NOT is_read` / `is_public`, which SQLite only matches
+against an index condition, never a key column. On MySQL, which has no index
+conditions, they are composites with the filter as a key column instead.
+
+PostgreSQL prefers sequential scans on the tiny tables of a test database,
+so sequential scans are disabled for the duration of each EXPLAIN there.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification, Message, Story, Video, GroupMembership
+
+
+def _unread_notifications(user, other, group):
+    return Notification.objects.filter(user=user, is_read=False)
+
+
+def _notification_group(user, other, group):
+    return Notification.objects.filter(
+        user=user, notification_type='like', is_read=False,
+        updated_at__gte=timezone.now() - timedelta(hours=6)
+    )
+
+
+def _notification_page(user, other, group):
+    return Notification.objects.filter(user=user).order_by('-updated_at')[:20]
+
+
+def _unread_messages(user, other, group):
+    return Message.objects.filter(recipient=user, is_read=False)
+
+
+def _mark_conversation_read(user, other, group):
+    return Message.objects.filter(sender=other, recipient=user, is_read=False)
+
+
+def _conversation(user, other, group):
+    return Message.objects.filter(sender=user, recipient=other).order_by('created_at')
+
+
+def _active_stories(user, other, group):
+    return Story.objects.filter(author=other, expires_at__gt=timezone.now()).order_by('created_at')
+
+
+def _videos_by_category(user, other, group):
+    return Video.objects.filter(category='music', is_public=True).order_by('-created_at')
+
+
+def _videos_feed(user, other, group):
+    return Video.objects.filter(is_public=True).order_by('-created_at')
+
+
+def _trending_videos(user, other, group):
+    return Video.objects.filter(
+        is_public=True, created_at__gte=timezone.now() - timedelta(days=7)
+    ).order_by('-views')[:10]
+
+
+def _is_member(user, other, group):
+    return GroupMembership.objects.filter(user=user, group=group, status='approved')
+
+
+def _group_members(user, other, group):
+    return GroupMembership.objects.filter(group=group, status='approved')
+
+
+# name: (query builder, indexes the plan may use)
+HOT_QUERIES = {
+    'unread_notifications': (_unread_notifications, ('core_notif_unread_idx', 'core_notif_user_recent_idx')),
+    'notification_group': (_notification_group, ('core_notif_unread_idx',)),
+    'notification_page': (_notification_page, ('core_notif_user_recent_idx',)),
+    'unread_messages': (_unread_messages, ('core_msg_unread_idx',)),
+    'mark_conversation_read': (_mark_conversation_read, ('core_msg_unread_idx', 'core_msg_thread_idx')),
+    'conversation': (_conversation, ('core_msg_thread_idx',)),
+    'active_stories': (_active_stories, ('core_story_author_expiry_idx',)),
+    'videos_by_category': (_videos_by_category, ('core_video_category_idx',)),
+    'videos_feed': (_videos_feed, ('core_video_recent_idx',)),
+    'trending_videos': (_trending_videos, ('core_video_recent_idx',)),
+    'is_member': (_is_member, ('core_groupmembership_user_id_group_id',)),
+    'group_members': (_group_members, ('core_membership_group_idx',)),
+}
+
+
+def explain(queryset):
+    """Return the plan of `queryset` as text"""
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def capture_query_plans(user, other, group):
+    """Return {name: (plan, index used or None)} for every hot query"""
+    plans = {}
+    for name, (build, indexes) in HOT_QUERIES.items():
+        plan = explain(build(user, other, group))
+        plans[name] = (plan, next((index for index in indexes if index in plan), None))
+    return plans
@@ -0,0 +1,201 @@
+"""
+Related videos index.
+
+Neighbours are scored offline from shared tags, co-occurrence in the same
+playlist and co-likes (users who liked both videos), then stored as top-N
+RelatedVideo rows so video_detail only needs one keyed read.
+
+Signals in core/signals.py flag videos as `related_stale` when one of those
+inputs changes; `python manage.py build_related_videos` recomputes only the
+stale ones. A change also moves the scores of the other side of each pair, so
+the neighbours are flagged with it:
+
+  - a playlist entry: every video in that playlist
+  - a like: every other video the same user liked
+  - an edited video: its playlist neighbours, co-liked videos and every video
+    whose list shows it
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Video, VideoLike, Playlist, RelatedVideo
+from .caching import bump_object_version
+
+RELATED_VIDEOS_LIMIT = 10
+REFRESH_BATCH_SIZE = 500
+
+TAG_WEIGHT = 1.0
+PLAYLIST_WEIGHT = 2.0
+CO_LIKE_WEIGHT = 1.5
+SAME_CATEGORY_WEIGHT = 0.5
+
+# Tags, playlists and likers shared by more videos than this carry almost no
+# signal and would make scoring quadratic, so they are skipped.
+MAX_FANOUT = 1000
+
+
+def parse_tags(tags):
+    """Split the comma-separated tags field into normalized tags"""
+    if not tags:
+        return set()
+    return {tag.strip().lower() for tag in tags.split(',') if tag.strip()}
+
+
+def _load_public_videos():
+    """Return (tags by video, category by video, videos by tag) for public videos"""
+    video_tags = {}
+    categories = {}
+    tag_index = defaultdict(set)
+
+    rows = Video.objects.filter(is_public=True).values_list('id', 'tags', 'category')
+    for video_id, tags, category in rows.iterator():
+        parsed = parse_tags(tags)
+        video_tags[video_id] = parsed
+        categories[video_id] = category
+        for tag in parsed:
+            tag_index[tag].add(video_id)
+
+    return video_tags, categories, tag_index
+
+
+def _add_co_occurrence(scores, video_ids, pairs, weight):
+    """Score videos sharing a group key, given (group key, video id) pairs"""
+    groups = defaultdict(list)
+    for key, video_id in pairs:
+        groups[key].append(video_id)
+
+    for members in groups.values():
+        if len(members) > MAX_FANOUT:
+            continue
+        for video_id in members:
+            if video_id not in video_ids:
+                continue
+            for other_id in members:
+                if other_id != video_id:
+                    scores[video_id][other_id] += weight
+
+
+def compute_neighbors(video_ids, public_videos=None, limit=RELATED_VIDEOS_LIMIT):
+    """Return {video_id: [(related_id, score), ...]} for the given videos"""
+    video_ids = set(video_ids)
+    video_tags, categories, tag_index = public_videos or _load_public_videos()
+    scores = defaultdict(Counter)
+
+    # Shared tags
+    for video_id in video_ids:
+        for tag in video_tags.get(video_id, ()):
+            tagged = tag_index[tag]
+            if len(tagged) > MAX_FANOUT:
+                continue
+            for other_id in tagged:
+                if other_id != video_id:
+                    scores[video_id][other_id] += TAG_WEIGHT
+
+    # Same-playlist co-occurrence
+    through = Playlist.videos.through
+    playlist_ids = through.objects.filter(video_id__in=video_ids).values('playlist_id')
+    _add_co_occurrence(
+        scores, video_ids,
+        through.objects.filter(playlist_id__in=playlist_ids).values_list('playlist_id', 'video_id'),
+        PLAYLIST_WEIGHT,
+    )
+
+    # Co-likes
+    liker_ids = VideoLike.objects.filter(video_id__in=video_ids).values('user_id')
+    _add_co_occurrence(
+        scores, video_ids,
+        VideoLike.objects.filter(user_id__in=liker_ids).values_list('user_id', 'video_id'),
+        CO_LIKE_WEIGHT,
+    )
+
+    neighbors = {}
+    for video_id in video_ids:
+        candidates = scores.get(video_id, Counter())
+        for other_id in list(candidates):
+            if other_id not in categories:
+                # Private or deleted videos are never recommended
+                del candidates[other_id]
+            elif categories[other_id] == categories.get(video_id):
+                candidates[other_id] += SAME_CATEGORY_WEIGHT
+        neighbors[video_id] = candidates.most_common(limit)
+
+    return neighbors
+
+
+def refresh_related_videos(video_ids=None, limit=RELATED_VIDEOS_LIMIT, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Recompute neighbour lists, by default for every stale video.
+    Returns the number of videos refreshed.
+    """
+    if video_ids is None:
+        video_ids = Video.objects.filter(related_stale=True).values_list('id', flat=True)
+    video_ids = list(video_ids)
+    if not video_ids:
+        return 0
+
+    public_videos = _load_public_videos()
+
+    for start in range(0, len(video_ids), batch_size):
+        batch = video_ids[start:start + batch_size]
+        neighbors = compute_neighbors(batch, public_videos, limit)
+
+        with transaction.atomic():
+            RelatedVideo.objects.filter(video_id__in=batch).delete()
+            RelatedVideo.objects.bulk_create([
+                RelatedVideo(video_id=video_id, related_id=related_id, score=score)
+                for video_id, ranked in neighbors.items()
+                for related_id, score in ranked
+            ])
+            Video.objects.filter(id__in=batch).update(related_stale=False)
+
+        # Cached pages and validators of these videos show the old neighbours
+        for video_id in batch:
+            bump_object_version(Video, video_id)
+
+    return len(video_ids)
+
+
+def mark_related_stale(video_ids):
+    """Flag videos so the next build_related_videos run recomputes them"""
+    Video.objects.filter(id__in=video_ids, related_stale=False).update(related_stale=True)
+
+
+def _stale(condition):
+    Video.objects.filter(condition, related_stale=False).update(related_stale=True)
+
+
+def _in_playlists(playlist_ids):
+    return Q(id__in=Playlist.videos.through.objects.filter(playlist_id__in=playlist_ids).values('video_id'))
+
+
+def mark_playlist_stale(playlist_ids, video_ids=()):
+    """Flag `video_ids` and every video in the given playlists"""
+    _stale(Q(id__in=list(video_ids)) | _in_playlists(playlist_ids))
+
+
+def mark_co_likes_stale(user_id, video_id):
+    """Flag a video and every other video liked by `user_id`"""
+    _stale(Q(id=video_id) | Q(id__in=VideoLike.objects.filter(user_id=user_id).values('video_id')))
+
+
+def mark_neighbourhood_stale(video_id):
+    """Flag a video, its playlist neighbours and co-liked videos, and the videos listing it"""
+    playlist_ids = Playlist.videos.through.objects.filter(video_id=video_id).values('playlist_id')
+    liker_ids = VideoLike.objects.filter(video_id=video_id).values('user_id')
+    _stale(
+        Q(id=video_id)
+        | _in_playlists(playlist_ids)
+        | Q(id__in=VideoLike.objects.filter(user_id__in=liker_ids).values('video_id'))
+        | Q(id__in=RelatedVideo.objects.filter(related_id=video_id).values('video_id'))
+    )
+
+
+def get_related_videos(video, limit=5):
+    """Read a video's precomputed neighbours in a single indexed query"""
+    entries = RelatedVideo.objects.filter(
+        video=video,
+        related__is_public=True
+    ).select_related('related__author')[:limit]
+    return [entry.related for entry in entries]
@@ -0,0 +1,203 @@
+"""
+Retention for the append-only activity tables.
+
+Notifications and story views are written on every like, follow, message and
+story tap and were never removed, so they grew into the largest tables and
+slowed down every per-user lookup. `apply_retention` (run by the
+prune_activity command) removes rows older than their TTL:
+
+  - Notification: per notification type, by updated_at (NOTIFICATION_RETENTION_DAYS)
+  - StoryView: by viewed_at (STORY_VIEW_RETENTION_DAYS). Views of expired stories
+    are already removed by the story sweeper, so this mostly trims highlights.
+
+On PostgreSQL expired rows are moved, one month at a time, into monthly archive
+tables (core_notification_archive_202401, ...) with a DELETE ... RETURNING
+feeding an INSERT, so a batch is a single statement. Old months can then be
+dropped whole with `drop_archive_tables`, which is instant compared to deleting
+rows. Other databases delete in primary-key chunks.
+
+Every batch is its own transaction so the tables stay writable while pruning.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification, StoryView
+
+DEFAULT_NOTIFICATION_RETENTION_DAYS = {
+    'like': 30,
+    'follow': 90,
+    'comment': 90,
+    'message': 90,
+}
+DEFAULT_STORY_VIEW_RETENTION_DAYS = 30
+PRUNE_BATCH_SIZE = 1000
+
+
+def notification_retention_days():
+    """TTL in days per notification type, from settings.NOTIFICATION_RETENTION_DAYS"""
+    days = dict(DEFAULT_NOTIFICATION_RETENTION_DAYS)
+    days.update(getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {}))
+    return days
+
+
+def story_view_retention_days():
+    return getattr(settings, 'STORY_VIEW_RETENTION_DAYS', DEFAULT_STORY_VIEW_RETENTION_DAYS)
+
+
+def use_archive_tables():
+    return connection.vendor == 'postgresql'
+
+
+def _month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(moment):
+    return _month_start(_month_start(moment) + timedelta(days=32))
+
+
+def _archive_table(model, month):
+    return f'{model._meta.db_table}_archive_{month:%Y%m}'
+
+
+def _move_to_archive(queryset, model, date_field, cutoff, batch_size, max_batches):
+    """PostgreSQL: move matching rows into monthly archive tables"""
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    oldest = queryset.order_by(date_field).values_list(date_field, flat=True).first()
+    if oldest is None:
+        return 0, 0
+
+    moved = 0
+    batches = 0
+    month = _month_start(oldest)
+    while month < cutoff and (max_batches is None or batches < max_batches):
+        month_end = min(_next_month(month), cutoff)
+        archive = _archive_table(model, month)
+        ids_sql, ids_params = queryset.filter(**{
+            f'{date_field}__gte': month,
+            f'{date_field}__lt': month_end,
+        }).order_by().values('pk').query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{archive}" (LIKE "{table}" INCLUDING DEFAULTS)'
+            )
+            archived_columns = {
+                column.name for column in connection.introspection.get_table_description(cursor, archive)
+            }
+        # Named columns, not SELECT *: an archive created before a migration
+        # added or reordered fields must keep accepting rows
+        columns = ', '.join(
+            f'"{field.column}"' for field in model._meta.concrete_fields if field.column in archived_columns
+        )
+
+        while max_batches is None or batches < max_batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'WITH moved AS ('
+                    f'  DELETE FROM "{table}" WHERE "{pk}" IN ({ids_sql} LIMIT %s) RETURNING {columns}'
+                    f') INSERT INTO "{archive}" ({columns}) SELECT {columns} FROM moved',
+                    (*ids_params, batch_size)
+                )
+                count = cursor.rowcount
+            if not count:
+                break
+            moved += count
+            batches += 1
+            if count < batch_size:
+                break
+
+        month = _next_month(month)
+    return moved, batches
+
+
+def _delete_in_chunks(queryset, batch_size, max_batches):
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        batches += 1
+    return deleted, batches
+
+
+def prune(model, date_field, cutoff, filters=None, batch_size=PRUNE_BATCH_SIZE,
+          max_batches=None, dry_run=False, archive=None):
+    """
+    Remove rows of `model` whose `date_field` is older than `cutoff`.
+    Returns a metrics dict: table, rows, batches, seconds, archived.
+    """
+    if archive is None:
+        archive = use_archive_tables()
+    queryset = model.objects.filter(**{f'{date_field}__lt': cutoff}, **(filters or {}))
+
+    started = time.monotonic()
+    if dry_run:
+        rows, batches = queryset.count(), 0
+    elif archive:
+        rows, batches = _move_to_archive(queryset, model, date_field, cutoff, batch_size, max_batches)
+    else:
+        rows, batches = _delete_in_chunks(queryset, batch_size, max_batches)
+
+    return {
+        'table': model._meta.db_table,
+        'rows': rows,
+        'batches': batches,
+        'seconds': time.monotonic() - started,
+        'archived': archive and not dry_run,
+    }
+
+
+def apply_retention(batch_size=PRUNE_BATCH_SIZE, max_batches=None, dry_run=False, now=None):
+    """Apply every retention policy; returns one metrics dict per policy"""
+    now = now or timezone.now()
+    results = []
+
+    for notification_type, days in sorted(notification_retention_days().items()):
+        result = prune(
+            Notification, 'updated_at', now - timedelta(days=days),
+            filters={'notification_type': notification_type},
+            batch_size=batch_size, max_batches=max_batches, dry_run=dry_run,
+        )
+        result['policy'] = f'notification:{notification_type} ({days}d)'
+        results.append(result)
+
+    days = story_view_retention_days()
+    result = prune(
+        StoryView, 'viewed_at', now - timedelta(days=days),
+        batch_size=batch_size, max_batches=max_batches, dry_run=dry_run,
+    )
+    result['policy'] = f'story_view ({days}d)'
+    results.append(result)
+
+    return results
+
+
+def drop_archive_tables(months, now=None):
+    """PostgreSQL: drop archive tables for months more than `months` months ago"""
+    if not use_archive_tables():
+        return []
+
+    month = _month_start(now or timezone.now())
+    for _ in range(months):
+        month = _month_start(month - timedelta(days=1))
+    keep_from = f'{month:%Y%m}'
+
+    dropped = []
+    prefixes = [f'{model._meta.db_table}_archive_' for model in (Notification, StoryView)]
+    for table in connection.introspection.table_names():
+        prefix = next((p for p in prefixes if table.startswith(p)), None)
+        if prefix and table[len(prefix):].isdigit() and table[len(prefix):] < keep_from:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE "{table}"')
+            dropped.append(table)
+    return dropped
@@ -1,7 +1,21 @@
-from django.db.models.signals import post_save
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import (
+    Profile, Like, Comment, Story, Video, VideoLike, VideoComment, Playlist, PlaylistVideo, Post, Group, Follow,
+    GroupMembership, GroupPost, GroupPostLike, GroupPostComment
+)
+from .likes import invalidate_liked_posts
+from .stories import invalidate_story_trays, in_sweep
+from .related_videos import mark_playlist_stale, mark_co_likes_stale, mark_neighbourhood_stale
+from .suggestions import mark_suggestions_stale
+from .memberships import invalidate_memberships
+from .group_directory import refresh_group_counts
+from .playlists import append_videos
+from .caching import bump_object_version
+from .member_actions import in_batch_operation
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -11,3 +25,211 @@ def create_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+
+# ========== LIKED POSTS CACHE ==========
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def like_changed(sender, instance, **kwargs):
+    invalidate_liked_posts(instance.user_id)
+
+
+# ========== STORY TRAY CACHE ==========
+
+@receiver(post_save, sender=Story)
+@receiver(post_delete, sender=Story)
+def story_changed(sender, instance, **kwargs):
+    # The sweeper invalidates once per batch
+    if not in_sweep():
+        invalidate_story_trays()
+
+
+# ========== RELATED VIDEOS INDEX ==========
+
+@receiver(post_save, sender=Video)
+def video_changed(sender, instance, created, **kwargs):
+    # New videos start stale; edits may change tags, category or visibility
+    if not created:
+        mark_neighbourhood_stale(instance.pk)
+
+@receiver(post_save, sender=VideoLike)
+@receiver(post_delete, sender=VideoLike)
+def video_like_changed(sender, instance, **kwargs):
+    mark_co_likes_stale(instance.user_id, instance.video_id)
+
+@receiver(post_save, sender=PlaylistVideo)
+def playlist_entry_saved(sender, instance, created, **kwargs):
+    # Moves only change the position
+    if created:
+        mark_playlist_stale([instance.playlist_id], [instance.video_id])
+
+@receiver(post_delete, sender=PlaylistVideo)
+def playlist_entry_deleted(sender, instance, **kwargs):
+    mark_playlist_stale([instance.playlist_id], [instance.video_id])
+
+@receiver(m2m_changed, sender=PlaylistVideo)
+def playlist_videos_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() bulk inserts rows without post_save; clear() is caught before the rows go
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            mark_playlist_stale(pk_set or (), [instance.pk])
+        else:
+            mark_playlist_stale([instance.pk], pk_set or ())
+    elif action == 'pre_clear':
+        if reverse:
+            mark_playlist_stale(instance.playlists.values('pk'), [instance.pk])
+        else:
+            mark_playlist_stale([instance.pk])
+
+
+# ========== PLAYLIST ORDER ==========
+
+@receiver(m2m_changed, sender=PlaylistVideo)
+def playlist_videos_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # Rows added with playlist.videos.add() have no position yet
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for playlist_id in pk_set:
+            append_videos(playlist_id, [instance.pk])
+    else:
+        append_videos(instance.pk, pk_set)
+
+
+# ========== FOLLOW SUGGESTIONS ==========
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    mark_suggestions_stale([instance.follower_id])
+
+@receiver(post_save, sender=GroupMembership)
+@receiver(post_delete, sender=GroupMembership)
+def membership_changed(sender, instance, **kwargs):
+    if not in_batch_operation():
+        mark_suggestions_stale([instance.user_id])
+
+
+# ========== GROUP POST COUNTERS ==========
+
+def _adjust_group_post_count(post_id, field, delta):
+    GroupPost.objects.filter(pk=post_id).update(**{field: Greatest(F(field) + delta, 0)})
+
+@receiver(post_save, sender=GroupPostLike)
+@receiver(post_save, sender=GroupPostComment)
+def group_post_activity_added(sender, instance, created, **kwargs):
+    if created:
+        field = 'like_count' if sender is GroupPostLike else 'comment_count'
+        _adjust_group_post_count(instance.post_id, field, 1)
+
+@receiver(post_delete, sender=GroupPostLike)
+@receiver(post_delete, sender=GroupPostComment)
+def group_post_activity_removed(sender, instance, **kwargs):
+    field = 'like_count' if sender is GroupPostLike else 'comment_count'
+    _adjust_group_post_count(instance.post_id, field, -1)
+
+
+# ========== GROUP MEMBERSHIP CACHE ==========
+
+@receiver(post_save, sender=GroupMembership)
+@receiver(post_delete, sender=GroupMembership)
+def cached_membership_changed(sender, instance, **kwargs):
+    if not in_batch_operation():
+        invalidate_memberships([instance.user_id], instance.group_id)
+
+
+# ========== GROUP DIRECTORY COUNTERS ==========
+
+def _deleting_group(origin):
+    return isinstance(origin, Group) or (isinstance(origin, QuerySet) and origin.model is Group)
+
+@receiver(post_save, sender=GroupMembership)
+@receiver(post_save, sender=GroupPost)
+def group_counts_saved(sender, instance, created, **kwargs):
+    # Membership saves may approve a request; post edits change no counter
+    if created or sender is GroupMembership:
+        refresh_group_counts([instance.group_id])
+
+@receiver(post_delete, sender=GroupMembership)
+@receiver(post_delete, sender=GroupPost)
+def group_counts_deleted(sender, instance, origin=None, **kwargs):
+    # Nothing to recount when the group itself is being deleted; bulk removals recount once
+    if not _deleting_group(origin) and not (sender is GroupMembership and in_batch_operation()):
+        refresh_group_counts([instance.group_id])
+
+
+# ========== OBJECT CACHE VERSIONS ==========
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Playlist)
+@receiver(post_delete, sender=Playlist)
+@receiver(post_save, sender=GroupPost)
+@receiver(post_delete, sender=GroupPost)
+def cached_object_changed(sender, instance, **kwargs):
+    bump_object_version(sender, instance.pk)
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def profile_posts_changed(sender, instance, **kwargs):
+    bump_object_version(Profile, instance.author_id)
+
+@receiver(post_save, sender=GroupPost)
+@receiver(post_delete, sender=GroupPost)
+@receiver(post_save, sender=GroupMembership)
+@receiver(post_delete, sender=GroupMembership)
+def group_content_changed(sender, instance, **kwargs):
+    if not (sender is GroupMembership and in_batch_operation()):
+        bump_object_version(Group, instance.group_id)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def cached_profile_changed(sender, instance, **kwargs):
+    bump_object_version(Profile, instance.user_id)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_counts_changed(sender, instance, **kwargs):
+    bump_object_version(Profile, instance.follower_id)
+    bump_object_version(Profile, instance.following_id)
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def post_activity_changed(sender, instance, **kwargs):
+    bump_object_version(Post, instance.post_id)
+
+@receiver(post_save, sender=GroupPostLike)
+@receiver(post_delete, sender=GroupPostLike)
+@receiver(post_save, sender=GroupPostComment)
+@receiver(post_delete, sender=GroupPostComment)
+def group_post_activity_changed(sender, instance, **kwargs):
+    bump_object_version(GroupPost, instance.post_id)
+
+@receiver(post_save, sender=VideoLike)
+@receiver(post_delete, sender=VideoLike)
+@receiver(post_save, sender=VideoComment)
+@receiver(post_delete, sender=VideoComment)
+def video_activity_changed(sender, instance, **kwargs):
+    bump_object_version(Video, instance.video_id)
+
+@receiver(post_save, sender=PlaylistVideo)
+@receiver(post_delete, sender=PlaylistVideo)
+def cached_playlist_entry_changed(sender, instance, **kwargs):
+    bump_object_version(Playlist, instance.playlist_id)
+
+@receiver(m2m_changed, sender=PlaylistVideo)
+def cached_playlist_videos_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove'):
+        return
+    if not reverse:
+        bump_object_version(Playlist, instance.pk)
+    else:
+        for playlist_id in pk_set or ():
+            bump_object_version(Playlist, playlist_id)
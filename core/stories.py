@@ -0,0 +1,344 @@
+"""
+Story tray for the feed and stories pages.
+
+The tray lists every followed author (and the viewer) with active stories.
+It is built from a single query over active stories, using the
+(author, expires_at) index and an EXISTS on StoryView for the unseen flag,
+then grouped per author in Python. Each story user gets:
+
+  - story_ids: active story ids, oldest first (playback order)
+  - latest_story: the newest active story
+  - story_count
+  - has_unseen: whether the viewer has not seen one of them yet
+
+Trays are cached briefly per viewer. create_story/delete_story bump a global
+version so followers never see a deleted story for long, and view_story drops
+the viewer's own tray so the unseen ring clears right away.
+
+Story views are recorded without a database round-trip per tap: new
+(story, viewer) pairs are appended to a queue in the shared cache (redis in
+production), and `flush_story_views` writes the queue with one
+bulk_create(ignore_conflicts=True) once it holds STORY_VIEW_BUFFER_SIZE
+views, and whenever the flush_story_views command runs. Per-story view counts
+are cached and only incremented after the rows they count are written, so
+they trail the queue by at most one flush. The viewer's seen set is cached
+too, which skips repeat taps and clears the tray ring before the flush.
+
+Expired stories are swept out of the Story table in bounded batches by
+`sweep_expired_stories` (run by the sweep_expired_stories command), either
+into ArchivedStory or deleted outright. Stories kept in a highlight stay.
+The story_changed receiver in core/signals.py skips stories deleted by the
+sweeper, which bumps the tray version once per batch instead.
+"""
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .caching import private_user_fields
+from .models import Story, StoryView, ArchivedStory
+
+STORY_TRAY_TIMEOUT = 60
+STORY_TRAY_VERSION_KEY = 'story_tray:version'
+
+
+def _tray_version():
+    version = cache.get(STORY_TRAY_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(STORY_TRAY_VERSION_KEY, version, None)
+    return version
+
+
+def _tray_key(user_id):
+    return f'story_tray:{_tray_version()}:{user_id}'
+
+
+def build_story_tray(user):
+    """Return the story users visible to `user`, unseen authors first"""
+    following_ids = user.following.values('following')
+    stories = Story.objects.filter(
+        Q(author__in=following_ids) | Q(author=user),
+        expires_at__gt=timezone.now()
+    ).select_related('author__profile').defer(*private_user_fields('author__')).annotate(
+        seen=Exists(StoryView.objects.filter(story=OuterRef('pk'), viewer=user))
+    ).order_by('author_id', 'created_at')
+
+    # Views still queued for the next flush
+    recently_seen = cache.get(_seen_key(user.id), frozenset())
+
+    tray = {}
+    for story in stories:
+        story_user = tray.get(story.author_id)
+        if story_user is None:
+            story_user = story.author
+            story_user.story_ids = []
+            story_user.has_unseen = False
+            tray[story.author_id] = story_user
+        story_user.story_ids.append(story.id)
+        story_user.latest_story = story
+        if not (story.seen or story.id in recently_seen) and story.author_id != user.id:
+            story_user.has_unseen = True
+
+    story_users = list(tray.values())
+    for story_user in story_users:
+        story_user.story_count = len(story_user.story_ids)
+
+    story_users.sort(key=lambda u: (
+        u.id != user.id,
+        not u.has_unseen,
+        -u.latest_story.created_at.timestamp(),
+    ))
+    return story_users
+
+
+def get_story_tray(user):
+    """Cached version of build_story_tray"""
+    key = _tray_key(user.id)
+    story_users = cache.get(key)
+    if story_users is None:
+        story_users = build_story_tray(user)
+        cache.set(key, story_users, STORY_TRAY_TIMEOUT)
+    return story_users
+
+
+def get_active_stories(author_id):
+    """Active stories of one author, oldest first (cached with the trays)"""
+    key = f'story_tray:{_tray_version()}:author:{author_id}'
+    stories = cache.get(key)
+    if stories is None:
+        stories = list(
+            Story.objects.filter(
+                author_id=author_id,
+                expires_at__gt=timezone.now()
+            ).order_by('created_at')
+        )
+        cache.set(key, stories, STORY_TRAY_TIMEOUT)
+    now = timezone.now()
+    return [story for story in stories if story.expires_at > now]
+
+
+def invalidate_story_trays():
+    """Called when a story is created or deleted"""
+    try:
+        cache.incr(STORY_TRAY_VERSION_KEY)
+    except ValueError:
+        cache.set(STORY_TRAY_VERSION_KEY, 2, None)
+
+
+def invalidate_story_tray(user_id):
+    """Called when `user_id` views a story"""
+    cache.delete(_tray_key(user_id))
+
+
+# ========== STORY VIEW RECORDING ==========
+
+STORY_VIEW_BUFFER_SIZE = 100
+STORY_VIEW_CACHE_TIMEOUT = 60 * 60 * 24
+STORY_VIEW_FLUSH_LOCK_TIMEOUT = 60
+
+# Queue slots are numbered by incrementing the tail; flushes advance the head
+STORY_VIEW_QUEUE_HEAD_KEY = 'story_views:queue:head'
+STORY_VIEW_QUEUE_TAIL_KEY = 'story_views:queue:tail'
+STORY_VIEW_QUEUE_SKIP_KEY = 'story_views:queue:skip'
+STORY_VIEW_FLUSH_LOCK_KEY = 'story_views:queue:lock'
+
+
+def _seen_key(viewer_id):
+    return f'story_views:seen:{viewer_id}'
+
+
+def _count_key(story_id):
+    return f'story_views:count:{story_id}'
+
+
+def _slot_key(slot):
+    return f'story_views:queue:{slot}'
+
+
+def _seen_story_ids(viewer_id):
+    """Ids of active stories the viewer has seen (one query on a cache miss)"""
+    key = _seen_key(viewer_id)
+    seen = cache.get(key)
+    if seen is None:
+        seen = frozenset(
+            StoryView.objects.filter(
+                viewer_id=viewer_id,
+                story__expires_at__gt=timezone.now()
+            ).values_list('story_id', flat=True)
+        )
+        cache.set(key, seen, STORY_VIEW_CACHE_TIMEOUT)
+    return seen
+
+
+def _enqueue_view(story_id, viewer_id):
+    """Append a view to the shared queue; returns its slot number"""
+    try:
+        slot = cache.incr(STORY_VIEW_QUEUE_TAIL_KEY)
+    except ValueError:
+        cache.add(STORY_VIEW_QUEUE_TAIL_KEY, 0, None)
+        slot = cache.incr(STORY_VIEW_QUEUE_TAIL_KEY)
+    cache.set(_slot_key(slot), (story_id, viewer_id), STORY_VIEW_CACHE_TIMEOUT)
+    return slot
+
+
+def record_story_view(story_id, viewer_id):
+    """
+    Queue a view of `story_id` by `viewer_id`.
+    Returns True if it is the viewer's first view of that story.
+    """
+    seen = _seen_story_ids(viewer_id)
+    if story_id in seen:
+        return False
+
+    slot = _enqueue_view(story_id, viewer_id)
+    cache.set(_seen_key(viewer_id), seen | {story_id}, STORY_VIEW_CACHE_TIMEOUT)
+
+    if slot - cache.get(STORY_VIEW_QUEUE_HEAD_KEY, 0) >= STORY_VIEW_BUFFER_SIZE:
+        flush_story_views()
+    return True
+
+
+def _write_views(pairs):
+    """Insert the new pairs and bump the cached counts of their stories"""
+    # Stories deleted or swept since the view are skipped; replayed pairs are not counted twice
+    live_ids = set(
+        Story.objects.filter(id__in={story_id for story_id, _ in pairs}).values_list('id', flat=True)
+    )
+    existing = set(
+        StoryView.objects.filter(
+            story_id__in=live_ids,
+            viewer_id__in={viewer_id for _, viewer_id in pairs}
+        ).values_list('story_id', 'viewer_id')
+    )
+    new_pairs = [pair for pair in pairs if pair[0] in live_ids and pair not in existing]
+    StoryView.objects.bulk_create([
+        StoryView(story_id=story_id, viewer_id=viewer_id)
+        for story_id, viewer_id in new_pairs
+    ], ignore_conflicts=True)
+
+    for story_id, added in Counter(story_id for story_id, _ in new_pairs).items():
+        try:
+            cache.incr(_count_key(story_id), added)
+        except ValueError:
+            pass  # not cached: story_view_count counts the table
+    return len(new_pairs)
+
+
+def flush_story_views():
+    """Write the queued views in one INSERT; returns the number of new views written"""
+    if not cache.add(STORY_VIEW_FLUSH_LOCK_KEY, 1, STORY_VIEW_FLUSH_LOCK_TIMEOUT):
+        return 0  # another worker is flushing
+    try:
+        head = cache.get(STORY_VIEW_QUEUE_HEAD_KEY, 0)
+        tail = cache.get(STORY_VIEW_QUEUE_TAIL_KEY, 0)
+        queued = cache.get_many([_slot_key(slot) for slot in range(head + 1, tail + 1)])
+
+        # An empty slot is usually a view being written right now, so the
+        # flush stops there; if it is still empty next time its writer died.
+        skip = cache.get(STORY_VIEW_QUEUE_SKIP_KEY)
+        pairs = set()
+        done = head
+        for slot in range(head + 1, tail + 1):
+            pair = queued.get(_slot_key(slot))
+            if pair is None and slot != skip:
+                cache.set(STORY_VIEW_QUEUE_SKIP_KEY, slot, None)
+                break
+            if pair is not None:
+                pairs.add(tuple(pair))
+            done = slot
+
+        written = _write_views(pairs) if pairs else 0
+        # Only drop the slots once their rows are in; a crash before this replays them
+        cache.set(STORY_VIEW_QUEUE_HEAD_KEY, done, None)
+        cache.delete_many([_slot_key(slot) for slot in range(head + 1, done + 1)])
+        return written
+    finally:
+        cache.delete(STORY_VIEW_FLUSH_LOCK_KEY)
+
+
+def story_view_count(story_id):
+    """Number of viewers of a story, as of the last flush"""
+    key = _count_key(story_id)
+    count = cache.get(key)
+    if count is None:
+        count = StoryView.objects.filter(story_id=story_id).count()
+        cache.add(key, count, STORY_VIEW_CACHE_TIMEOUT)
+    return count
+
+
+# ========== EXPIRED STORY SWEEPER ==========
+
+SWEEP_BATCH_SIZE = 500
+
+_sweep_state = threading.local()
+
+
+def in_sweep():
+    """Whether this thread is deleting a batch of expired stories"""
+    return getattr(_sweep_state, 'active', False)
+
+
+def _archive_stories(story_ids):
+    view_counts = dict(
+        StoryView.objects.filter(story_id__in=story_ids).values('story_id').annotate(
+            total=Count('id')
+        ).values_list('story_id', 'total')
+    )
+    ArchivedStory.objects.bulk_create([
+        ArchivedStory(
+            original_id=story.id,
+            author_id=story.author_id,
+            image=story.image,
+            video=story.video,
+            caption=story.caption,
+            duration=story.duration,
+            background_color=story.background_color,
+            view_count=view_counts.get(story.id, 0),
+            created_at=story.created_at,
+            expires_at=story.expires_at,
+        )
+        for story in Story.objects.filter(id__in=story_ids)
+    ], ignore_conflicts=True)
+
+
+def sweep_expired_stories(archive=True, batch_size=SWEEP_BATCH_SIZE, max_batches=None, now=None):
+    """
+    Move expired stories (and their StoryView rows) that are not part of any
+    highlight out of the Story table, one transaction per batch.
+    Returns the number of stories swept.
+    """
+    now = now or timezone.now()
+    # Queued views of expiring stories count towards their archived view_count
+    flush_story_views()
+    swept = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        story_ids = list(
+            Story.objects.filter(
+                expires_at__lte=now,
+                highlights__isnull=True
+            ).order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not story_ids:
+            break
+
+        with transaction.atomic():
+            if archive:
+                _archive_stories(story_ids)
+            StoryView.objects.filter(story_id__in=story_ids).delete()
+            _sweep_state.active = True
+            try:
+                Story.objects.filter(id__in=story_ids).delete()
+            finally:
+                _sweep_state.active = False
+            invalidate_story_trays()
+
+        swept += len(story_ids)
+        batches += 1
+
+    return swept
@@ -0,0 +1,189 @@
+"""
+Who-to-follow suggestions.
+
+Candidates are scored offline for each user from:
+
+  - their network: accounts followed by the people they follow, one point
+    per mutual connection
+  - shared groups: members of the groups they belong to
+  - popularity: the most followed accounts, so everyone gets a full list
+
+and the top SUGGESTIONS_LIMIT are stored as FollowSuggestion rows, so the feed
+reads them with one indexed query. Accounts followed since the last build are
+filtered out at read time.
+
+Signals in core/signals.py flag a profile as `suggestions_stale` when the
+user's follows or group memberships change;
+`python manage.py build_follow_suggestions` recomputes only the stale ones
+(--all for the periodic full rebuild, which also picks up changes further out
+in the network).
+"""
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Follow, FollowSuggestion, GroupMembership, Profile
+
+SUGGESTIONS_LIMIT = 20
+REFRESH_BATCH_SIZE = 500
+POPULAR_POOL = 50
+POPULAR_CACHE_TIMEOUT = 60 * 60
+
+NETWORK_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+# At most this much, so popularity only breaks ties and fills the list
+POPULAR_WEIGHT = 0.25
+
+# Accounts following more users than this, and groups with more members,
+# carry almost no signal and would make scoring quadratic, so they are skipped.
+MAX_FANOUT = 1000
+
+
+def popular_user_ids(limit=POPULAR_POOL):
+    """The most followed active accounts, most followed first"""
+    return list(
+        Follow.objects.filter(following__is_active=True).values('following').annotate(
+            total=Count('id')
+        ).order_by('-total', 'following').values_list('following', flat=True)[:limit]
+    )
+
+
+def compute_suggestions(user_ids, popular=None, limit=SUGGESTIONS_LIMIT):
+    """Return {user_id: [(suggested_id, score, reason), ...]} for the given users"""
+    user_ids = set(user_ids)
+    popular = popular_user_ids() if popular is None else popular
+
+    following = defaultdict(set)
+    for follower_id, following_id in Follow.objects.filter(
+        follower_id__in=user_ids
+    ).values_list('follower_id', 'following_id').iterator():
+        following[follower_id].add(following_id)
+
+    # Two hops out: who the people they follow follow
+    followed_ids = Follow.objects.filter(follower_id__in=user_ids).values('following_id')
+    second_hop = defaultdict(list)
+    for follower_id, following_id in Follow.objects.filter(
+        follower_id__in=followed_ids
+    ).values_list('follower_id', 'following_id').iterator():
+        second_hop[follower_id].append(following_id)
+
+    network = defaultdict(Counter)
+    for user_id in user_ids:
+        for followed_id in following[user_id]:
+            candidates = second_hop.get(followed_id, ())
+            if len(candidates) > MAX_FANOUT:
+                continue
+            for candidate_id in candidates:
+                network[user_id][candidate_id] += NETWORK_WEIGHT
+
+    # Shared groups
+    memberships = GroupMembership.objects.filter(status='approved')
+    user_groups = defaultdict(set)
+    for user_id, group_id in memberships.filter(user_id__in=user_ids).values_list('user_id', 'group_id'):
+        user_groups[user_id].add(group_id)
+
+    group_members = defaultdict(list)
+    for group_id, member_id in memberships.filter(
+        group_id__in=memberships.filter(user_id__in=user_ids).values('group_id')
+    ).values_list('group_id', 'user_id').iterator():
+        group_members[group_id].append(member_id)
+
+    shared = defaultdict(Counter)
+    for user_id in user_ids:
+        for group_id in user_groups[user_id]:
+            members = group_members[group_id]
+            if len(members) > MAX_FANOUT:
+                continue
+            for member_id in members:
+                shared[user_id][member_id] += GROUP_WEIGHT
+
+    popularity = {
+        candidate_id: POPULAR_WEIGHT * (1 - rank / len(popular))
+        for rank, candidate_id in enumerate(popular)
+    }
+
+    suggestions = {}
+    for user_id in user_ids:
+        excluded = following[user_id] | {user_id}
+        candidates = (set(network[user_id]) | set(shared[user_id]) | set(popularity)) - excluded
+
+        ranked = []
+        for candidate_id in candidates:
+            parts = {
+                'network': network[user_id][candidate_id],
+                'groups': shared[user_id][candidate_id],
+                'popular': popularity.get(candidate_id, 0),
+            }
+            reason = max(parts, key=parts.get)
+            ranked.append((candidate_id, sum(parts.values()), reason))
+
+        ranked.sort(key=lambda entry: (-entry[1], entry[0]))
+        suggestions[user_id] = ranked[:limit]
+
+    return suggestions
+
+
+def refresh_follow_suggestions(user_ids=None, limit=SUGGESTIONS_LIMIT, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Recompute suggestion lists, by default for every stale profile.
+    Returns the number of users refreshed.
+    """
+    if user_ids is None:
+        user_ids = Profile.objects.filter(suggestions_stale=True).values_list('user_id', flat=True)
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+
+    popular = popular_user_ids()
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        suggestions = compute_suggestions(batch, popular, limit)
+
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=batch).delete()
+            FollowSuggestion.objects.bulk_create([
+                FollowSuggestion(user_id=user_id, suggested_id=suggested_id, score=score, reason=reason)
+                for user_id, ranked in suggestions.items()
+                for suggested_id, score, reason in ranked
+            ])
+            Profile.objects.filter(user_id__in=batch).update(suggestions_stale=False)
+
+    return len(user_ids)
+
+
+def mark_suggestions_stale(user_ids):
+    """Flag profiles so the next build_follow_suggestions run recomputes them"""
+    Profile.objects.filter(user_id__in=user_ids, suggestions_stale=False).update(suggestions_stale=True)
+
+
+def get_suggestions(user, limit=5):
+    """
+    Users to suggest to `user`, each with a `suggestion_reason`, from the
+    precomputed list; popular accounts until the first build.
+    """
+    following_ids = Follow.objects.filter(follower=user).values('following_id')
+    entries = FollowSuggestion.objects.filter(user=user).exclude(
+        suggested_id__in=following_ids
+    ).select_related('suggested__profile')[:limit]
+
+    suggestions = []
+    for entry in entries:
+        entry.suggested.suggestion_reason = entry.get_reason_display()
+        suggestions.append(entry.suggested)
+    if suggestions or not user.profile.suggestions_stale:
+        return suggestions
+
+    popular = cache.get_or_set('follow_suggestions:popular', popular_user_ids, POPULAR_CACHE_TIMEOUT)
+    users = User.objects.filter(id__in=popular).exclude(id=user.id).exclude(
+        id__in=following_ids
+    ).select_related('profile').in_bulk()
+    reason = dict(FollowSuggestion.REASON_CHOICES)['popular']
+    for user_id in popular:
+        if user_id in users and len(suggestions) < limit:
+            users[user_id].suggestion_reason = reason
+            suggestions.append(users[user_id])
+    return suggestions
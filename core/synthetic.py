@@ -0,0 +1,397 @@
+"""
+Synthetic dataset for benchmarks and load tests.
+
+`generate_dataset` fills the database with a social graph shaped like a real
+one: user popularity follows a power law (a few accounts have most of the
+followers, likes, messages and group members) and so does how active each
+user is. Runs are repeatable: the same seed and scale give the same rows.
+
+Rows are written with bulk_create in fixed-size batches, one transaction per
+batch, with model signals muted (bulk_create sends none, and deleting a
+previous dataset would otherwise invalidate caches row by row) and
+auto_now/auto_now_add switched off so timestamps spread over the past
+`days` days instead of all being "now".
+
+Synthetic users are named `<prefix>_<n>` and share one password hash
+(SYNTHETIC_PASSWORD), so benchmark clients can log in as any of them.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import signals
+from django.utils import timezone
+
+from .group_directory import refresh_group_counts
+from .models import (
+    Profile, Post, Follow, Like, Comment, Message, Notification, Story, StoryView, Video,
+    Group, GroupMembership, GroupPost
+)
+
+SYNTHETIC_PREFIX = 'synth'
+SYNTHETIC_PASSWORD = 'benchpass123'
+BATCH_SIZE = 5000
+
+# Average rows per user; the actual number per user is Pareto distributed
+RATES = {
+    'follows': 40,
+    'posts': 4,
+    'likes': 30,
+    'comments': 4,
+    'messages': 6,
+    'videos': 0.3,
+    'stories': 0.2,
+    'notifications': 20,
+    'groups': 0.02,
+    'memberships': 3,
+    'group_posts': 1,
+}
+POPULARITY_EXPONENT = 1.0
+ACTIVITY_SHAPE = 2.0
+
+WORDS = (
+    'coffee code sunset project weekend music travel campus exam team game '
+    'photo city friends night learning python django launch idea design coffee '
+    'morning run book movie lecture lab party food summer winter'
+).split()
+
+TIMESTAMPED_MODELS = (
+    Profile, Post, Follow, Like, Comment, Message, Notification, Story, Video,
+    Group, GroupMembership, GroupPost
+)
+
+
+@contextmanager
+def muted_signals():
+    """Disconnect every model signal receiver for the duration of the block"""
+    saved = []
+    for signal in (signals.pre_save, signals.post_save, signals.pre_delete,
+                   signals.post_delete, signals.m2m_changed):
+        saved.append((signal, signal.receivers))
+        signal.receivers = []
+        signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+@contextmanager
+def historical_timestamps(models=TIMESTAMPED_MODELS):
+    """Let bulk_create keep the created_at/updated_at values we set"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DatasetGenerator:
+    """Generates one dataset; see generate_dataset"""
+
+    def __init__(self, users, seed=0, prefix=SYNTHETIC_PREFIX, batch_size=BATCH_SIZE,
+                 days=365, scale=1.0, log=None):
+        self.num_users = users
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.span = timedelta(days=days).total_seconds()
+        self.rates = {name: rate * scale for name, rate in RATES.items()}
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    # ----- helpers -----
+
+    def insert(self, model, objects, ignore_conflicts=False):
+        started = time.monotonic()
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+            total += len(batch)
+        name = str(model._meta.verbose_name_plural).lower()
+        self.counts[name] = self.counts.get(name, 0) + total
+        self.log(f'   {name:<18} {total:>10} row(s) in {time.monotonic() - started:.1f}s')
+
+    def activity(self, name):
+        """How many `name` rows one user creates: Pareto distributed around the rate"""
+        value = self.rates[name] * self.rng.paretovariate(ACTIVITY_SHAPE) * (ACTIVITY_SHAPE - 1) / ACTIVITY_SHAPE
+        return int(value) + (self.rng.random() < value % 1)
+
+    def past(self, after=None):
+        """A random moment in the window (after `after` if given)"""
+        start = after or self.now - timedelta(seconds=self.span)
+        return start + (self.now - start) * self.rng.random()
+
+    def sentence(self, words=8):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def pick_users(self, k):
+        """k users (with repeats) chosen by popularity"""
+        return self.rng.choices(self.user_ids, cum_weights=self.user_weights, k=k)
+
+    def pick_posts(self, k):
+        return self.rng.choices(self.post_ids, cum_weights=self.post_weights, k=k)
+
+    # ----- tables -----
+
+    def create_users(self):
+        password = make_password(SYNTHETIC_PASSWORD)
+        self.insert(User, (
+            User(
+                username=f'{self.prefix}_{i}',
+                email=f'{self.prefix}_{i}@example.com',
+                first_name=self.rng.choice(WORDS).capitalize(),
+                password=password,
+                date_joined=self.past(),
+            )
+            for i in range(self.num_users)
+        ))
+        users = list(
+            User.objects.filter(username__startswith=f'{self.prefix}_').order_by('id').values_list('id', 'date_joined')
+        )
+        self.user_ids = [user_id for user_id, _ in users]
+        self.joined = dict(users)
+
+        # Popularity rank is independent of sign-up order
+        ranks = list(range(1, len(self.user_ids) + 1))
+        self.rng.shuffle(ranks)
+        self.popularity = {user_id: rank ** -POPULARITY_EXPONENT for user_id, rank in zip(self.user_ids, ranks)}
+        self.user_weights = list(accumulate(self.popularity[user_id] for user_id in self.user_ids))
+
+        self.insert(Profile, (
+            Profile(user_id=user_id, bio=self.sentence(), created_at=joined, updated_at=joined)
+            for user_id, joined in users
+        ))
+
+    def create_follows(self):
+        def follows():
+            for follower in self.user_ids:
+                following = set(self.pick_users(min(self.activity('follows'), len(self.user_ids) - 1)))
+                following.discard(follower)
+                for followed in following:
+                    yield Follow(follower_id=follower, following_id=followed, created_at=self.past(self.joined[follower]))
+        self.insert(Follow, follows(), ignore_conflicts=True)
+
+    def create_posts(self):
+        def posts():
+            for author in self.user_ids:
+                for _ in range(self.activity('posts')):
+                    created = self.past(self.joined[author])
+                    yield Post(author_id=author, content=self.sentence(12), created_at=created, updated_at=created)
+        self.insert(Post, posts())
+
+        rows = Post.objects.filter(
+            author__username__startswith=f'{self.prefix}_'
+        ).order_by('id').values_list('id', 'author_id', 'created_at')
+        self.post_ids, self.post_authors, self.post_dates = [], {}, {}
+        weights = []
+        for post_id, author_id, created in rows.iterator(chunk_size=self.batch_size):
+            self.post_ids.append(post_id)
+            self.post_authors[post_id] = author_id
+            self.post_dates[post_id] = created
+            weights.append(self.popularity[author_id])
+        self.post_weights = list(accumulate(weights))
+
+    def create_likes_and_comments(self):
+        if not self.post_ids:
+            return
+
+        def likes():
+            for user_id in self.user_ids:
+                for post_id in set(self.pick_posts(self.activity('likes'))):
+                    yield Like(user_id=user_id, post_id=post_id, created_at=self.past(self.post_dates[post_id]))
+
+        def comments():
+            for user_id in self.user_ids:
+                for post_id in self.pick_posts(self.activity('comments')):
+                    created = self.past(self.post_dates[post_id])
+                    yield Comment(
+                        author_id=user_id, post_id=post_id, content=self.sentence(),
+                        created_at=created, updated_at=created
+                    )
+
+        self.insert(Like, likes(), ignore_conflicts=True)
+        self.insert(Comment, comments())
+
+    def create_messages(self):
+        def messages():
+            for sender in self.user_ids:
+                for recipient in self.pick_users(self.activity('messages')):
+                    if recipient != sender:
+                        yield Message(
+                            sender_id=sender, recipient_id=recipient, content=self.sentence(),
+                            is_read=self.rng.random() < 0.8, created_at=self.past(self.joined[sender])
+                        )
+        self.insert(Message, messages())
+
+    def create_notifications(self):
+        types = ['like', 'like', 'like', 'comment', 'follow', 'message']
+
+        def notifications():
+            for recipient in self.pick_users(int(self.rates['notifications'] * len(self.user_ids))):
+                actor = self.rng.choice(self.user_ids)
+                if actor == recipient:
+                    continue
+                notification_type = self.rng.choice(types)
+                actor_count = 1 if notification_type == 'message' else self.activity('notifications') // 5 + 1
+                created = self.past(self.joined[recipient])
+                yield Notification(
+                    user_id=recipient, actor_id=actor, notification_type=notification_type,
+                    actor_count=actor_count, actor_sample=[actor], is_read=self.rng.random() < 0.7,
+                    created_at=created, updated_at=created
+                )
+        self.insert(Notification, notifications())
+
+    def create_videos_and_stories(self):
+        categories = [value for value, _ in Video.CATEGORY_CHOICES]
+
+        def videos():
+            for author in self.user_ids:
+                for _ in range(self.activity('videos')):
+                    created = self.past(self.joined[author])
+                    yield Video(
+                        author_id=author, title=self.sentence(4), description=self.sentence(20),
+                        video_file='samples/elephants', category=self.rng.choice(categories),
+                        tags=', '.join(self.rng.sample(WORDS, 3)), is_public=self.rng.random() < 0.9,
+                        views=int(self.popularity[author] * 10000 * self.rng.random()),
+                        created_at=created, updated_at=created
+                    )
+
+        def stories():
+            for author in self.user_ids:
+                for _ in range(self.activity('stories')):
+                    # About a third still active
+                    created = self.now - timedelta(hours=self.rng.uniform(0, 72))
+                    yield Story(
+                        author_id=author, image='sample', caption=self.sentence(4),
+                        created_at=created, expires_at=created + timedelta(hours=24)
+                    )
+
+        self.insert(Video, videos())
+        self.insert(Story, stories())
+
+    def create_groups(self):
+        categories = ['study', 'sports', 'music', 'gaming', 'clubs', 'housing']
+
+        def groups():
+            for admin in self.user_ids:
+                for _ in range(self.activity('groups')):
+                    created = self.past(self.joined[admin])
+                    yield Group(
+                        name=self.sentence(3), description=self.sentence(15), admin_id=admin,
+                        privacy='private' if self.rng.random() < 0.1 else 'public',
+                        category=self.rng.choice(categories), created_at=created, updated_at=created
+                    )
+        self.insert(Group, groups())
+
+        groups = list(
+            Group.objects.filter(admin__username__startswith=f'{self.prefix}_').order_by('id').values_list(
+                'id', 'admin_id', 'created_at'
+            )
+        )
+        if not groups:
+            return
+        group_ids = [group_id for group_id, _, _ in groups]
+        group_weights = list(accumulate(self.popularity[admin] for _, admin, _ in groups))
+        created = {group_id: created for group_id, _, created in groups}
+        admin_of = {}
+        for group_id, admin, _ in groups:
+            admin_of.setdefault(admin, set()).add(group_id)
+
+        members = {}
+        for user_id in self.user_ids:
+            joined = set(self.rng.choices(group_ids, cum_weights=group_weights, k=self.activity('memberships')))
+            members[user_id] = joined | admin_of.get(user_id, set())
+
+        def memberships():
+            for user_id, joined in members.items():
+                for group_id in sorted(joined):
+                    yield GroupMembership(
+                        user_id=user_id, group_id=group_id,
+                        role='admin' if group_id in admin_of.get(user_id, ()) else 'member',
+                        joined_at=self.past(max(created[group_id], self.joined[user_id]))
+                    )
+
+        def group_posts():
+            for user_id, joined in members.items():
+                joined = sorted(joined)
+                for _ in range(self.activity('group_posts') if joined else 0):
+                    group_id = self.rng.choice(joined)
+                    posted = self.past(max(created[group_id], self.joined[user_id]))
+                    yield GroupPost(
+                        author_id=user_id, group_id=group_id, content=self.sentence(12),
+                        created_at=posted, updated_at=posted
+                    )
+
+        self.insert(GroupMembership, memberships(), ignore_conflicts=True)
+        self.insert(GroupPost, group_posts())
+        # Signals are muted, so set the directory counters in one pass
+        refresh_group_counts(group_ids)
+
+    def generate(self):
+        with muted_signals(), historical_timestamps():
+            self.create_users()
+            self.create_follows()
+            self.create_posts()
+            self.create_likes_and_comments()
+            self.create_messages()
+            self.create_notifications()
+            self.create_videos_and_stories()
+            self.create_groups()
+        return self.counts
+
+
+def generate_dataset(users, seed=0, prefix=SYNTHETIC_PREFIX, batch_size=BATCH_SIZE,
+                     days=365, scale=1.0, log=None):
+    """Create a synthetic dataset of `users` users; returns rows created per table"""
+    return DatasetGenerator(users, seed, prefix, batch_size, days, scale, log).generate()
+
+
+def delete_dataset(prefix=SYNTHETIC_PREFIX, batch_size=BATCH_SIZE):
+    """Remove the users created by generate_dataset and everything they own"""
+    users = User.objects.filter(username__startswith=f'{prefix}_')
+    deleted = 0
+    with muted_signals():
+        # Leaf tables first, so deleting users does not collect millions of rows
+        for queryset in (
+            StoryView.objects.filter(viewer__in=users),
+            GroupPost.objects.filter(author__in=users),
+            GroupMembership.objects.filter(user__in=users),
+            Group.objects.filter(admin__in=users),
+            Notification.objects.filter(user__in=users),
+            Notification.objects.filter(actor__in=users),
+            Message.objects.filter(sender__in=users),
+            Message.objects.filter(recipient__in=users),
+            Comment.objects.filter(author__in=users),
+            Like.objects.filter(user__in=users),
+            Follow.objects.filter(follower__in=users),
+            Follow.objects.filter(following__in=users),
+        ):
+            deleted += queryset.delete()[0]
+
+        while True:
+            ids = list(users.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                deleted += User.objects.filter(id__in=ids).delete()[0]
+    return deleted
@@ -24,6 +24,7 @@ urlpatterns = [
     path('post/<int:post_id>/delete/', views.delete_post, name='delete_post'),
     path('post/<int:post_id>/like/', views.like_post, name='like_post'),
     path('post/<int:post_id>/comment/', views.add_comment, name='add_comment'),
+    path('post/<int:post_id>/comments/', views.post_comments, name='post_comments'),
     
     # ========== FOLLOW ==========
     path('follow/<str:username>/', views.follow_user, name='follow_user'),
@@ -35,6 +36,7 @@ urlpatterns = [
     
     # ========== NOTIFICATIONS ==========
     path('notifications/', views.notifications, name='notifications'),
+    path('api/notifications/', views.notifications_api, name='notifications_api'),
     
     # ========== SEARCH ==========
     path('search/', views.search_users, name='search_users'),
@@ -59,6 +61,7 @@ urlpatterns = [
     path('video/<int:video_id>/delete/', views.delete_video, name='delete_video'),
     path('video/<int:video_id>/like/', views.like_video, name='like_video'),
     path('video/<int:video_id>/comment/', views.add_video_comment, name='add_video_comment'),
+    path('video/comment/<int:comment_id>/replies/', views.video_comment_replies, name='video_comment_replies'),
     path('videos/category/<str:category>/', views.videos_by_category, name='videos_by_category'),
     path('videos/search/', views.search_videos, name='search_videos'),
     
@@ -70,6 +73,7 @@ urlpatterns = [
     path('playlist/<int:playlist_id>/delete/', views.delete_playlist, name='delete_playlist'),
     path('playlist/<int:playlist_id>/add/<int:video_id>/', views.add_to_playlist, name='add_to_playlist'),
     path('playlist/<int:playlist_id>/remove/<int:video_id>/', views.remove_from_playlist, name='remove_from_playlist'),
+    path('playlist/<int:playlist_id>/move/<int:video_id>/', views.move_in_playlist, name='move_in_playlist'),
     
     # ========== GROUPS ==========
     path('groups/', views.groups_list, name='groups_list'),
@@ -84,6 +88,7 @@ urlpatterns = [
     path('group/post/<int:post_id>/like/', views.like_group_post, name='like_group_post'),
     path('group/post/<int:post_id>/comment/', views.add_group_comment, name='add_group_comment'),
     path('group/<int:group_id>/members/', views.group_members, name='group_members'),
+    path('group/<int:group_id>/members/bulk/', views.bulk_member_action, name='bulk_member_action'),
     path('group/<int:group_id>/member/<int:user_id>/remove/', views.remove_group_member, name='remove_group_member'),
     path('group/<int:group_id>/member/<int:user_id>/make-moderator/', views.make_moderator, name='make_moderator'),
 ]
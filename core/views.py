@@ -3,12 +3,14 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
-from django.db.models import Q, Count
+from django.core.paginator import Paginator
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
+from django.db.models import Q, Case, When, F, Max
 from django.db import IntegrityError
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from datetime import timedelta
 import json
 from .ai_utils import (
@@ -21,10 +23,44 @@ from .ai_utils import (
 )
 
 from .models import (
-    Profile, Post, Like, Comment, Follow, Message, Notification,
-    Story, StoryView, StoryHighlight, Video, VideoLike, VideoComment,
+    Profile, Post, Like, Comment, Follow, Message,
+    Story, StoryHighlight, Video, VideoLike, VideoComment,
     Playlist, Group, GroupMembership, GroupPost, GroupPostLike, GroupPostComment
 )
+from .related_videos import get_related_videos
+from .comment_tree import load_comment_threads, load_thread_replies
+from .suggestions import get_suggestions
+from .memberships import get_membership, get_memberships, check_membership
+from .group_feed import build_group_feed, parse_group_cursor
+from .playlists import (
+    add_video, remove_video, move_video, playlist_page, playlist_totals, playlists_for_video
+)
+from .member_actions import MEMBER_ACTIONS, remove_members, promote_moderators
+from .group_directory import (
+    DIRECTORY_SORTS, DEFAULT_SORT, directory_groups, directory_page, directory_categories
+)
+from .page_cache import anonymous_page_cache, profile_page_version
+from .conditional import (
+    conditional_page, profile_versions, video_versions, group_versions, playlist_versions
+)
+from .feed import (
+    build_feed_page, count_subquery, older_comments, avatar_url,
+    FEED_PAGE_SIZE, FRAGMENT_CACHE_TIMEOUT, SUGGESTIONS_CACHE_TIMEOUT
+)
+from .likes import mark_liked_posts
+from .caching import (
+    object_version, get_profile_user, get_follow_counts, get_video, get_group, get_playlist,
+    private_user_fields
+)
+from .notifications import (
+    notify, user_notifications, prepare_notifications, mark_as_read,
+    serialize_notification, notification_cursor, notifications_before, notifications_after,
+    NOTIFICATIONS_PER_PAGE
+)
+from .stories import (
+    get_story_tray, invalidate_story_tray, get_active_stories,
+    record_story_view, story_view_count
+)
 from .forms import (
     UserUpdateForm, ProfileUpdateForm, PostForm, MessageForm,
     StoryForm, VideoForm, VideoCommentForm, PlaylistForm, GroupForm, GroupPostForm
@@ -158,59 +194,43 @@ def logout_view(request):
 def feed(request):
     """Main feed with posts and stories"""
     user = request.user
-    following_users = user.following.values_list('following', flat=True)
     
-    posts = Post.objects.filter(
-        Q(author=user) | Q(author__in=following_users)
-    ).select_related('author__profile').annotate(
-        like_count=Count('likes'),
-        comment_count=Count('comments')
-    ).order_by('-created_at')
+    posts = build_feed_page(user, request.GET.get('page'))
+    story_users = get_story_tray(user)
     
-    user_liked_posts = Like.objects.filter(user=user).values_list('post_id', flat=True)
-    
-    story_users = User.objects.filter(
-        Q(id__in=following_users) | Q(id=user.id),
-        stories__expires_at__gt=timezone.now()
-    ).distinct().prefetch_related('stories')
-    
-    for story_user in story_users:
-        story_user.latest_story = story_user.stories.filter(
-            expires_at__gt=timezone.now()
-        ).first()
-    
-    suggested_users = User.objects.exclude(
-        Q(id=user.id) | Q(id__in=following_users)
-    ).select_related('profile').annotate(
-        follower_count=Count('followers')
-    ).order_by('-follower_count')[:5]
+    # Lazy: only read when the cached sidebar fragment has expired
+    suggested_users = SimpleLazyObject(lambda: get_suggestions(user))
     
     context = {
         'posts': posts,
-        'user_liked_posts': list(user_liked_posts),
         'story_users': story_users,
         'suggested_users': suggested_users,
+        'suggestions_version': object_version(Profile, user.id),
+        'suggestions_timeout': SUGGESTIONS_CACHE_TIMEOUT,
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'core/feed.html', context)
 
 
+@conditional_page(profile_versions)
+@anonymous_page_cache(profile_page_version)
 def profile(request, username):
     """User profile page"""
-    profile_user = get_object_or_404(User, username=username)
-    posts = profile_user.posts.all().order_by('-created_at')
-    followers_count = profile_user.followers.count()
-    following_count = profile_user.following.count()
+    profile_user = get_profile_user(username)
+    posts = profile_user.posts.select_related('author__profile').annotate(
+        like_count=count_subquery(Like),
+        comment_count=count_subquery(Comment)
+    ).order_by('-created_at')
+    posts = Paginator(posts, FEED_PAGE_SIZE).get_page(request.GET.get('page'))
+    posts.object_list = mark_liked_posts(request.user, list(posts.object_list))
+    followers_count, following_count = get_follow_counts(profile_user)
     is_following = False
-    user_liked_posts = []
     
     if request.user.is_authenticated:
         is_following = Follow.objects.filter(
             follower=request.user, 
             following=profile_user
         ).exists()
-        user_liked_posts = Like.objects.filter(
-            user=request.user
-        ).values_list('post_id', flat=True)
     
     context = {
         'profile_user': profile_user,
@@ -219,7 +239,6 @@ def profile(request, username):
         'followers_count': followers_count,
         'following_count': following_count,
         'is_following': is_following,
-        'user_liked_posts': list(user_liked_posts),
     }
     return render(request, 'core/profile.html', context)
 
@@ -325,13 +344,7 @@ def like_post(request, post_id):
         liked = False
     else:
         liked = True
-        if post.author != request.user:
-            Notification.objects.create(
-                user=post.author,
-                actor=request.user,
-                notification_type='like',
-                post=post
-            )
+        notify(post.author, request.user, 'like', post=post)
     
     return JsonResponse({
         'liked': liked,
@@ -362,13 +375,7 @@ def add_comment(request, post_id):
         content=content
     )
     
-    if post.author != request.user:
-        Notification.objects.create(
-            user=post.author,
-            actor=request.user,
-            notification_type='comment',
-            post=post
-        )
+    notify(post.author, request.user, 'comment', post=post)
     
     profile_pic_url = request.user.profile.profile_picture.url if request.user.profile.profile_picture else None
     
@@ -383,6 +390,34 @@ def add_comment(request, post_id):
     })
 
 
+@login_required
+def post_comments(request, post_id):
+    """Comments older than ?before=<comment id>, oldest first (JSON)"""
+    post = get_object_or_404(Post, id=post_id)
+    
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    comments, has_more = older_comments(post.id, before)
+    
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.id,
+                'author_username': comment.author.username,
+                'author_avatar': avatar_url(comment.author),
+                'content': comment.content,
+                'created_at': comment.created_at.isoformat(),
+            }
+            for comment in comments
+        ],
+        'has_more': has_more,
+        'next_before': comments[0].id if has_more else None,
+    })
+
+
 # ========== FOLLOW VIEWS ==========
 
 @login_required
@@ -390,12 +425,9 @@ def follow_user(request, username):
     """Follow a user"""
     user_to_follow = get_object_or_404(User, username=username)
     if user_to_follow != request.user:
-        Follow.objects.get_or_create(follower=request.user, following=user_to_follow)
-        Notification.objects.create(
-            user=user_to_follow,
-            actor=request.user,
-            notification_type='follow'
-        )
+        _, created = Follow.objects.get_or_create(follower=request.user, following=user_to_follow)
+        if created:
+            notify(user_to_follow, request.user, 'follow')
         messages.success(request, f'You are now following {username}')
     return redirect('profile', username=username)
 
@@ -415,31 +447,26 @@ def unfollow_user(request, username):
 def messages_list(request):
     """List all conversations"""
     user = request.user
-    sent_users = Message.objects.filter(sender=user).values_list('recipient_id', flat=True).distinct()
-    received_users = Message.objects.filter(recipient=user).values_list('sender_id', flat=True).distinct()
-    conversation_user_ids = set(list(sent_users) + list(received_users))
+    # Latest message per conversation partner, in one grouped query
+    last_ids = Message.objects.filter(
+        Q(sender=user) | Q(recipient=user)
+    ).annotate(
+        partner=Case(When(sender=user, then=F('recipient')), default=F('sender'))
+    ).order_by().values('partner').annotate(last_id=Max('id')).values('last_id')
+    
+    last_messages = Message.objects.filter(id__in=last_ids).select_related(
+        'sender__profile', 'recipient__profile'
+    ).order_by('-created_at')
     
     conversations = []
-    for user_id in conversation_user_ids:
-        try:
-            other_user = User.objects.get(id=user_id)
-            if not other_user.username:
-                continue
-            
-            last_message = Message.objects.filter(
-                Q(sender=user, recipient=other_user) | 
-                Q(sender=other_user, recipient=user)
-            ).order_by('-created_at').first()
-            
-            if last_message:
-                conversations.append({
-                    'other_user': other_user,
-                    'last_message': last_message
-                })
-        except User.DoesNotExist:
+    for last_message in last_messages:
+        other_user = last_message.recipient if last_message.sender_id == user.id else last_message.sender
+        if not other_user.username:
             continue
-    
-    conversations.sort(key=lambda x: x['last_message'].created_at, reverse=True)
+        conversations.append({
+            'other_user': other_user,
+            'last_message': last_message
+        })
     
     return render(request, 'core/messages_list.html', {'conversations': conversations})
 
@@ -468,11 +495,7 @@ def message_detail(request, username):
                 recipient=other_user,
                 content=content
             )
-            Notification.objects.create(
-                user=other_user,
-                actor=request.user,
-                notification_type='message'
-            )
+            notify(other_user, request.user, 'message')
             return redirect('message_detail', username=username)
     
     context = {
@@ -487,46 +510,86 @@ def message_detail(request, username):
 @login_required
 def notifications(request):
     """View notifications"""
-    user_notifications = request.user.notifications.all().order_by('-created_at')
-    
-    for notif in user_notifications:
-        if notif.notification_type == 'like':
-            notif.message = f'{notif.actor.username} liked your post'
-        elif notif.notification_type == 'comment':
-            notif.message = f'{notif.actor.username} commented on your post'
-        elif notif.notification_type == 'follow':
-            notif.message = f'{notif.actor.username} started following you'
-        elif notif.notification_type == 'message':
-            notif.message = f'{notif.actor.username} sent you a message'
-        
-        if notif.notification_type == 'follow':
-            notif.link = f'/profile/{notif.actor.username}/'
-        elif notif.notification_type == 'message':
-            notif.link = f'/messages/{notif.actor.username}/'
+    page = Paginator(
+        user_notifications(request.user),
+        NOTIFICATIONS_PER_PAGE
+    ).get_page(request.GET.get('page'))
+    page.object_list = prepare_notifications(page.object_list)
+    
+    # Only what the user actually saw; rows keep is_read=False in memory for highlighting
+    mark_as_read(page.object_list)
+    
+    return render(request, 'core/notifications.html', {'notifications': page})
+
+
+@login_required
+def notifications_api(request):
+    """Incremental notifications feed (JSON)
+    
+    ?before=<cursor> returns the next older page (newest first).
+    ?after=<cursor> returns activity newer than the cursor, oldest first; keep
+    polling with next_after while has_more is true to catch up.
+    """
+    before = request.GET.get('before')
+    after = request.GET.get('after')
+    try:
+        if after:
+            queryset = notifications_after(request.user, after)
+        elif before:
+            queryset = notifications_before(request.user, before)
         else:
-            notif.link = '/'
+            queryset = user_notifications(request.user)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
     
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    items = list(queryset[:NOTIFICATIONS_PER_PAGE + 1])
+    has_more = len(items) > NOTIFICATIONS_PER_PAGE
+    items = prepare_notifications(items[:NOTIFICATIONS_PER_PAGE])
     
-    return render(request, 'core/notifications.html', {'notifications': user_notifications})
+    data = [serialize_notification(notification) for notification in items]
+    if request.GET.get('mark_read') == '1':
+        mark_as_read(items)
+    
+    if after:
+        newest = items[-1] if items else None
+        oldest = None
+    else:
+        newest = items[0] if items and not before else None
+        oldest = items[-1] if items else None
+    return JsonResponse({
+        'notifications': data,
+        'has_more': has_more,
+        'next_before': notification_cursor(oldest) if oldest else None,
+        'next_after': notification_cursor(newest) if newest else after or None,
+    })
 
 
 # ========== SEARCH VIEWS ==========
 
+SEARCH_RESULTS_LIMIT = 50
+
+
 @login_required
 def search_users(request):
-    """Search for users"""
+    """Search for users (the first SEARCH_RESULTS_LIMIT matches, with their counts)"""
     query = request.GET.get('q', '')
     results = []
+    total = 0
     
     if query:
-        results = User.objects.filter(
+        matches = User.objects.filter(
             Q(username__icontains=query) | 
             Q(first_name__icontains=query) | 
             Q(last_name__icontains=query)
         ).exclude(id=request.user.id)
+        total = matches.count()
+        results = matches.select_related('profile').defer(*private_user_fields()).annotate(
+            post_count=count_subquery(Post, 'author'),
+            follower_count=count_subquery(Follow, 'following'),
+            following_count=count_subquery(Follow, 'follower'),
+        ).order_by('username')[:SEARCH_RESULTS_LIMIT]
     
-    return render(request, 'core/search.html', {'query': query, 'results': results})
+    return render(request, 'core/search.html', {'query': query, 'results': results, 'total': total})
 
 
 # ========== STORY VIEWS ==========
@@ -534,17 +597,7 @@ def search_users(request):
 @login_required
 def stories_feed(request):
     """View active stories"""
-    following_users = request.user.following.values_list('following', flat=True)
-    twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-    
-    story_users = User.objects.filter(
-        Q(id__in=following_users) | Q(id=request.user.id),
-        stories__created_at__gte=twenty_four_hours_ago
-    ).distinct().prefetch_related('stories')
-    
-    for user in story_users:
-        user.latest_story = user.stories.filter(created_at__gte=twenty_four_hours_ago).first()
-        user.story_count = user.stories.filter(created_at__gte=twenty_four_hours_ago).count()
+    story_users = get_story_tray(request.user)
     
     return render(request, 'core/stories_feed.html', {'story_users': story_users})
 
@@ -571,23 +624,29 @@ def create_story(request):
 @login_required
 def view_story(request, story_id):
     """View a story"""
-    story = get_object_or_404(Story, id=story_id)
+    story = Story.objects.filter(
+        id=story_id,
+        expires_at__gt=timezone.now()
+    ).select_related('author__profile').first()
     
-    if story.is_expired():
+    if story is None:
+        # Expired (possibly already swept into the archive)
         return redirect('stories_feed')
     
     if request.user != story.author:
-        StoryView.objects.get_or_create(story=story, viewer=request.user)
+        if record_story_view(story.id, request.user.id):
+            invalidate_story_tray(request.user.id)
     
-    user_stories = Story.objects.filter(
-        author=story.author,
-        expires_at__gt=timezone.now()
-    ).order_by('created_at')
+    user_stories = get_active_stories(story.author_id)
+    story_ids = [user_story.id for user_story in user_stories]
+    position = story_ids.index(story.id) if story.id in story_ids else 0
     
     context = {
         'story': story,
         'user_stories': user_stories,
-        'views_count': story.views.count(),
+        'previous_story': user_stories[position - 1] if position > 0 else None,
+        'next_story': user_stories[position + 1] if position + 1 < len(user_stories) else None,
+        'views_count': story_view_count(story.id),
     }
     return render(request, 'core/view_story.html', context)
 
@@ -634,26 +693,40 @@ def upload_video(request):
     return render(request, 'core/upload_video.html', {'form': form})
 
 
+def count_video_view(request, video_id):
+    """Count the view before the ETag check, so revalidated (304) visits count too"""
+    video = get_video(video_id)
+    if request.user != video.author:
+        video.increment_views()
+
+
 @login_required
+@conditional_page(video_versions, always=count_video_view)
 def video_detail(request, video_id):
     """View video"""
-    video = get_object_or_404(Video, id=video_id)
-    
-    if request.user != video.author:
-        video.increment_views()
-    
-    comments = video.video_comments.filter(parent=None).select_related('author__profile')
-    related = Video.objects.filter(category=video.category, is_public=True).exclude(id=video.id)[:5]
+    # Cached copy: the view counter may lag by up to OBJECT_CACHE_TIMEOUT
+    video = get_video(video_id)
+    
+    comments = load_comment_threads(video, request.GET.get('page'))
+    related = get_related_videos(video)
+    if not related:
+        # Index not built for this video yet (e.g. just uploaded)
+        related = Video.objects.filter(
+            category=video.category,
+            is_public=True
+        ).exclude(id=video.id).select_related('author')[:5]
     user_liked = VideoLike.objects.filter(user=request.user, video=video).exists()
     tags_list = [tag.strip() for tag in video.tags.split(',')] if video.tags else []
     
     context = {
         'video': video,
         'comments': comments,
+        'comment_total': comments.paginator.count,
         'related': related,
         'user_liked': user_liked,
         'comment_form': VideoCommentForm(),
         'tags_list': tags_list,
+        'playlists': playlists_for_video(request.user, video),
     }
     return render(request, 'core/video_detail.html', context)
 
@@ -700,14 +773,28 @@ def create_playlist(request):
 
 
 @login_required
+@conditional_page(playlist_versions)
 def playlist_detail(request, playlist_id):
-    """View playlist"""
-    playlist = get_object_or_404(Playlist, id=playlist_id)
+    """View playlist, PLAYLIST_PAGE_SIZE videos at a time (?after=<cursor>)"""
+    playlist = get_playlist(playlist_id)
     
     if not playlist.is_public and playlist.user != request.user:
         return HttpResponseForbidden()
     
-    return render(request, 'core/playlist_detail.html', {'playlist': playlist})
+    after = request.GET.get('after') or None
+    page = playlist_page(playlist, after=after)
+    video_count, total_views = playlist_totals(playlist)
+    context = {
+        'playlist': playlist,
+        'videos': page['videos'],
+        'start': page['start'],
+        'has_more': page['has_more'],
+        'next_after': page['next_after'],
+        'is_first_page': after is None,
+        'video_count': video_count,
+        'total_views': total_views,
+    }
+    return render(request, 'core/playlist_detail.html', context)
 
 
 @login_required
@@ -724,15 +811,28 @@ def delete_playlist(request, playlist_id):
 
 @login_required
 def groups_list(request):
-    """List groups"""
-    public_groups = Group.objects.filter(privacy='public').annotate(
-        member_count=Count('members')
-    ).order_by('-created_at')
-    my_groups = request.user.joined_groups.all()
-    
+    """Group directory: ?sort=members|active, ?category=..., ?view=mine"""
+    mine = request.GET.get('view') == 'mine'
+    sort = request.GET.get('sort') if request.GET.get('sort') in DIRECTORY_SORTS else DEFAULT_SORT
+    category = request.GET.get('category', '')
+
+    page = directory_page(
+        directory_groups(request.user, sort=sort, category=category, mine=mine),
+        request.GET.get('page')
+    )
+    memberships = get_memberships(request, [group.id for group in page['groups']])
+    for group in page['groups']:
+        group.membership = memberships[group.id]
+
+    query = request.GET.copy()
+    query.pop('page', None)
     return render(request, 'core/groups_list.html', {
-        'groups': public_groups,
-        'my_groups': my_groups,
+        **page,
+        'mine': mine,
+        'sort': sort,
+        'category': category,
+        'categories': directory_categories(),
+        'page_query': query.urlencode(),
     })
 
 
@@ -760,28 +860,31 @@ def create_group(request):
 
 
 @login_required
+@conditional_page(group_versions)
 def group_detail(request, group_id):
     """View group"""
-    group = get_object_or_404(Group, id=group_id)
-    is_member = GroupMembership.objects.filter(
-        user=request.user,
-        group=group,
-        status='approved'
-    ).exists()
+    group = get_group(group_id)
+    membership = get_membership(request, group.id)
     
-    if group.privacy == 'private' and not is_member:
+    if group.privacy == 'private' and not membership.is_member:
         return HttpResponseForbidden("You must be a member to view this group")
     
-    posts = group.group_posts.all().select_related('author__profile')
-    membership = GroupMembership.objects.filter(user=request.user, group=group).first()
+    try:
+        before = parse_group_cursor(request.GET.get('before'))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    feed = build_group_feed(group, request.user, before)
     
     context = {
         'group': group,
-        'posts': posts,
-        'is_member': is_member,
+        'posts': feed['pinned'] + feed['posts'],
+        'has_more': feed['has_more'],
+        'next_before': feed['next_before'],
+        'is_first_page': before is None,
+        'is_member': membership.is_member,
         'membership': membership,
-        'is_admin': membership.role == 'admin' if membership else False,
-        'is_moderator': membership.role in ['admin', 'moderator'] if membership else False,
+        'is_admin': membership.is_admin,
+        'is_moderator': membership.is_moderator,
     }
     return render(request, 'core/group_detail.html', context)
 
@@ -955,12 +1058,7 @@ def like_video(request, video_id):
     if not created:
         like.delete()
     else:
-        if video.author != request.user:
-            Notification.objects.create(
-                user=video.author,
-                actor=request.user,
-                notification_type='like'
-            )
+        notify(video.author, request.user, 'like', video=video)
     
     messages.success(request, 'Video liked!' if created else 'Like removed')
     return redirect('video_detail', video_id=video_id)
@@ -980,22 +1078,47 @@ def add_video_comment(request, video_id):
             
             parent_id = request.POST.get('parent_id')
             if parent_id:
-                comment.parent_id = parent_id
+                comment.parent = get_object_or_404(VideoComment, id=parent_id, video=video)
             
             comment.save()
             
-            if video.author != request.user:
-                Notification.objects.create(
-                    user=video.author,
-                    actor=request.user,
-                    notification_type='comment'
-                )
+            notify(video.author, request.user, 'comment', video=video)
             
             messages.success(request, 'Comment added!')
     
     return redirect('video_detail', video_id=video_id)
 
 
+@login_required
+def video_comment_replies(request, comment_id):
+    """Load more replies of a comment thread (JSON)"""
+    root = get_object_or_404(VideoComment, id=comment_id, parent=None)
+    
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
+    
+    replies, has_more = load_thread_replies(root.id, offset=offset)
+    
+    return JsonResponse({
+        'replies': [
+            {
+                'id': reply.id,
+                'parent_id': reply.parent_id,
+                'after_id': reply.after_id,
+                'depth': reply.depth,
+                'author_username': reply.author.username,
+                'content': reply.content,
+                'created_at': reply.created_at.isoformat(),
+            }
+            for reply in replies
+        ],
+        'next_offset': offset + len(replies),
+        'has_more': has_more,
+    })
+
+
 # ========== MISSING PLAYLIST VIEWS ==========
 
 @login_required
@@ -1026,8 +1149,7 @@ def add_to_playlist(request, playlist_id, video_id):
     video = get_object_or_404(Video, id=video_id)
     
     if playlist.user == request.user:
-        if video not in playlist.videos.all():
-            playlist.videos.add(video)
+        if add_video(playlist, video):
             messages.success(request, f'Added to {playlist.title}')
         else:
             messages.info(request, 'Video already in playlist')
@@ -1039,24 +1161,46 @@ def add_to_playlist(request, playlist_id, video_id):
 def remove_from_playlist(request, playlist_id, video_id):
     """Remove video from playlist"""
     playlist = get_object_or_404(Playlist, id=playlist_id)
-    video = get_object_or_404(Video, id=video_id)
     
     if playlist.user == request.user:
-        playlist.videos.remove(video)
+        remove_video(playlist, video_id)
         messages.success(request, f'Removed from {playlist.title}')
     
     return redirect('playlist_detail', playlist_id=playlist_id)
 
 
+@login_required
+def move_in_playlist(request, playlist_id, video_id):
+    """Move a video within a playlist (POST after=<video id>, empty for the top)"""
+    playlist = get_object_or_404(Playlist, id=playlist_id)
+    
+    if playlist.user != request.user:
+        return HttpResponseForbidden()
+    if request.method != 'POST':
+        return redirect('playlist_detail', playlist_id=playlist_id)
+    
+    try:
+        after = int(request.POST['after']) if request.POST.get('after') else None
+    except ValueError:
+        messages.error(request, 'Invalid position')
+        return redirect('playlist_detail', playlist_id=playlist_id)
+    
+    if move_video(playlist, video_id, after_id=after):
+        messages.success(request, 'Playlist reordered')
+    else:
+        messages.error(request, 'Could not move that video')
+    return redirect('playlist_detail', playlist_id=playlist_id)
+
+
 # ========== MISSING GROUP VIEWS ==========
 
 @login_required
 def edit_group(request, group_id):
     """Edit group details"""
     group = get_object_or_404(Group, id=group_id)
+    resolve = check_membership if request.method == 'POST' else get_membership
     
-    membership = GroupMembership.objects.filter(user=request.user, group=group).first()
-    if not membership or membership.role != 'admin':
+    if not resolve(request, group.id).is_admin:
         return HttpResponseForbidden()
     
     if request.method == 'POST':
@@ -1076,14 +1220,9 @@ def edit_group(request, group_id):
 def create_group_post(request, group_id):
     """Create a post in a group"""
     group = get_object_or_404(Group, id=group_id)
+    resolve = check_membership if request.method == 'POST' else get_membership
     
-    is_member = GroupMembership.objects.filter(
-        user=request.user,
-        group=group,
-        status='approved'
-    ).exists()
-    
-    if not is_member:
+    if not resolve(request, group.id).is_member:
         return HttpResponseForbidden()
     
     if request.method == 'POST':
@@ -1106,11 +1245,9 @@ def create_group_post(request, group_id):
 def delete_group_post(request, post_id):
     """Delete a group post"""
     post = get_object_or_404(GroupPost, id=post_id)
-    group_id = post.group.id
+    group_id = post.group_id
     
-    membership = GroupMembership.objects.filter(user=request.user, group=post.group).first()
-    
-    if post.author == request.user or (membership and membership.role in ['admin', 'moderator']):
+    if post.author_id == request.user.id or check_membership(request, group_id).is_moderator:
         post.delete()
         messages.success(request, 'Post deleted')
     
@@ -1149,43 +1286,61 @@ def add_group_comment(request, post_id):
 
 @login_required
 def group_members(request, group_id):
-    """View group members"""
+    """View group members; moderators also see pending join requests"""
     group = get_object_or_404(Group, id=group_id)
+    membership = get_membership(request, group.id)
     
-    is_member = GroupMembership.objects.filter(
-        user=request.user,
-        group=group,
-        status='approved'
-    ).exists()
-    
-    if group.privacy != 'public' and not is_member:
+    if group.privacy != 'public' and not membership.is_member:
         return HttpResponseForbidden()
     
-    members = group.groupmembership_set.filter(status='approved').select_related('user__profile')
-    user_membership = GroupMembership.objects.filter(user=request.user, group=group).first()
+    memberships = group.groupmembership_set.select_related('user__profile')
+    members = memberships.filter(status='approved')
+    pending = memberships.filter(status='pending') if membership.is_moderator else []
     
     context = {
         'group': group,
         'members': members,
-        'is_admin': user_membership.role == 'admin' if user_membership else False,
-        'is_moderator': user_membership.role in ['admin', 'moderator'] if user_membership else False,
+        'pending': pending,
+        'is_admin': membership.is_admin,
+        'is_moderator': membership.is_moderator,
     }
     return render(request, 'core/group_members.html', context)
 
 
+@login_required
+def bulk_member_action(request, group_id):
+    """Apply one member action to many users (POST action=approve|remove|promote|demote, user_ids)"""
+    group = get_object_or_404(Group, id=group_id)
+    if request.method != 'POST' or request.POST.get('action') not in MEMBER_ACTIONS:
+        return redirect('group_members', group_id=group_id)
+    
+    operation, admin_only, done = MEMBER_ACTIONS[request.POST['action']]
+    if admin_only and request.user.id != group.admin_id:
+        return HttpResponseForbidden()
+    if not check_membership(request, group.id).is_moderator:
+        return HttpResponseForbidden()
+    
+    try:
+        user_ids = [int(user_id) for user_id in request.POST.getlist('user_ids')]
+    except ValueError:
+        messages.error(request, 'Invalid member selection')
+        return redirect('group_members', group_id=group_id)
+    
+    changed = operation(group, user_ids)
+    messages.success(request, f'{len(changed)} member{"s" if len(changed) != 1 else ""} {done}')
+    return redirect('group_members', group_id=group_id)
+
+
 @login_required
 def remove_group_member(request, group_id, user_id):
     """Remove a member from group (admin/moderator only)"""
     group = get_object_or_404(Group, id=group_id)
     user_to_remove = get_object_or_404(User, id=user_id)
     
-    requester_membership = GroupMembership.objects.filter(user=request.user, group=group).first()
-    
-    if not requester_membership or requester_membership.role not in ['admin', 'moderator']:
+    if not check_membership(request, group.id).is_moderator:
         return HttpResponseForbidden()
     
-    if user_to_remove != group.admin:
-        GroupMembership.objects.filter(user=user_to_remove, group=group).delete()
+    if remove_members(group, [user_to_remove.id]):
         messages.success(request, f'Removed {user_to_remove.username} from group')
     
     return redirect('group_members', group_id=group_id)
@@ -1200,11 +1355,7 @@ def make_moderator(request, group_id, user_id):
     if request.user != group.admin:
         return HttpResponseForbidden()
     
-    membership = GroupMembership.objects.filter(user=user, group=group).first()
-    if membership:
-        membership.role = 'moderator'
-        membership.save()
-        group.moderators.add(user)
+    if promote_moderators(group, [user.id]):
         messages.success(request, f'{user.username} is now a moderator')
     
-    return redirect('group_members', group_id=group_id)
\ No newline at end of file
+    return redirect('group_members', group_id=group_id)
@@ -0,0 +1,380 @@
+"""
+Load generator for a running UniVerse server (gunicorn or runserver).
+
+Simulated users log in as synthetic accounts (see the generate_dataset
+command) and replay a weighted mix of scenarios -- scrolling the feed, liking,
+commenting, messaging, watching stories, checking notifications -- with think
+time between actions. At the end it reports, per endpoint, throughput,
+latency percentiles and error rates.
+
+Only the standard library is used: requests go over asyncio streams with
+keep-alive, one connection per simulated user, so thousands of users fit in
+one process.
+
+Usage:
+    python manage.py generate_dataset --users 2000
+    gunicorn social_media.wsgi --workers 4 &
+    python load_test.py --url http://127.0.0.1:8000 --users 100 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import ssl
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+# weight, scenario name (see the SCENARIOS functions below)
+TRAFFIC_MIX = {
+    'feed_scroll': 40,
+    'view_story': 15,
+    'like_post': 15,
+    'comment': 8,
+    'send_message': 7,
+    'read_messages': 8,
+    'notifications': 7,
+}
+
+POST_ID = re.compile(r'id="post-(\d+)"')
+STORY_USER = re.compile(r'href="/stories/([^/"]+)/"')
+STORY_ID = re.compile(r'\bid: (\d+),')
+CONVERSATION = re.compile(r'href="/messages/([^/"]+)/"')
+PROFILE = re.compile(r'href="/profile/([^/"]+)/"')
+
+
+# ========== HTTP CLIENT ==========
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+class HttpError(Exception):
+    pass
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', 'replace')
+
+
+class HttpClient:
+    """Minimal HTTP/1.1 client with keep-alive and a cookie jar"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.tls = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.tls else 80)
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=ssl.create_default_context() if self.tls else None
+        )
+
+    async def request(self, method, path, form=None, headers=None):
+        body = urlencode(form).encode() if form is not None else b''
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+            'User-Agent: universe-load-test',
+        ]
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        if form is not None:
+            lines.append('Content-Type: application/x-www-form-urlencoded')
+        if body or method == 'POST':
+            lines.append(f'Content-Length: {len(body)}')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+        if self.reader is not None and self.reader.at_eof():
+            # The server already closed this idle keep-alive connection
+            await self.close()
+
+        # A POST that failed mid-request may still have been applied, so only
+        # idempotent requests are retried (once, on a new connection)
+        retries = 1 if method in IDEMPOTENT_METHODS else 0
+        for attempt in range(retries + 1):
+            try:
+                if self.writer is None:
+                    await self._connect()
+                self.writer.write(raw)
+                await self.writer.drain()
+                return await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                await self.close()
+                if attempt == retries:
+                    raise HttpError(str(e) or type(e).__name__)
+            except asyncio.TimeoutError:
+                await self.close()
+                raise HttpError('timeout')
+
+    async def _read_response(self):
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readuntil(b'\r\n')).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                cookie, _, _ = value.partition(';')
+                key, _, val = cookie.partition('=')
+                self.cookies[key.strip()] = val.strip()
+            headers[name] = value
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            await self.close()
+
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, headers, body)
+
+
+# ========== STATISTICS ==========
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.started = time.monotonic()
+
+    def record(self, endpoint, seconds, error=None):
+        self.latencies[endpoint].append(seconds * 1000)
+        if error:
+            self.errors[endpoint] += 1
+            self.error_samples.setdefault(endpoint, error)
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rows = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+
+            def pct(p):
+                return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 1)
+
+            rows[endpoint] = {
+                'requests': len(values),
+                'rps': round(len(values) / elapsed, 2),
+                'p50_ms': pct(50),
+                'p95_ms': pct(95),
+                'p99_ms': pct(99),
+                'max_ms': round(ordered[-1], 1),
+                'errors': self.errors[endpoint],
+                'error_rate': round(self.errors[endpoint] / len(values), 4),
+                'first_error': self.error_samples.get(endpoint),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            'duration_s': round(elapsed, 1),
+            'requests': total,
+            'rps': round(total / elapsed, 2) if elapsed else 0,
+            'errors': sum(self.errors.values()),
+            'endpoints': rows,
+        }
+
+
+# ========== SIMULATED USERS ==========
+
+class VirtualUser:
+    def __init__(self, username, password, base_url, stats, rng):
+        self.username = username
+        self.password = password
+        self.client = HttpClient(base_url)
+        self.stats = stats
+        self.rng = rng
+        self.post_ids = []
+        self.story_users = []
+        self.partners = []
+
+    async def call(self, endpoint, method, path, form=None, ok=(200, 302)):
+        """Request `path`, recording it under `endpoint`; returns the response or None"""
+        headers = {}
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.client.cookies.get('csrftoken', '')
+        started = time.monotonic()
+        try:
+            response = await self.client.request(method, path, form, headers)
+        except HttpError as e:
+            self.stats.record(endpoint, time.monotonic() - started, str(e))
+            return None
+        error = None if response.status in ok else f'HTTP {response.status}'
+        self.stats.record(endpoint, time.monotonic() - started, error)
+        return response if not error else None
+
+    async def login(self):
+        await self.call('GET /login/', 'GET', '/login/')
+        response = await self.call('POST /login/', 'POST', '/login/', {
+            'username': self.username,
+            'password': self.password,
+            'csrfmiddlewaretoken': self.client.cookies.get('csrftoken', ''),
+        }, ok=(302,))
+        return response is not None and 'sessionid' in self.client.cookies
+
+    def remember(self, attr, pattern, text):
+        found = pattern.findall(text)
+        if found:
+            setattr(self, attr, list(dict.fromkeys(found))[:50])
+
+    # ----- scenarios -----
+
+    async def feed_scroll(self):
+        for page in range(1, self.rng.randint(1, 3) + 1):
+            response = await self.call('GET /', 'GET', f'/?page={page}' if page > 1 else '/')
+            if response is None:
+                return
+            if page == 1:
+                self.remember('post_ids', POST_ID, response.text)
+                self.remember('story_users', STORY_USER, response.text)
+
+    async def like_post(self):
+        if not self.post_ids:
+            return await self.feed_scroll()
+        post_id = self.rng.choice(self.post_ids)
+        await self.call('POST /post/<id>/like/', 'POST', f'/post/{post_id}/like/', {})
+
+    async def comment(self):
+        if not self.post_ids:
+            return await self.feed_scroll()
+        post_id = self.rng.choice(self.post_ids)
+        await self.call('POST /post/<id>/comment/', 'POST', f'/post/{post_id}/comment/', {
+            'content': f'Load test comment {self.rng.randint(1, 10 ** 6)}'
+        })
+
+    async def read_messages(self):
+        response = await self.call('GET /messages/', 'GET', '/messages/')
+        if response is None:
+            return
+        self.remember('partners', CONVERSATION, response.text)
+        if self.partners:
+            partner = self.rng.choice(self.partners)
+            await self.call('GET /messages/<user>/', 'GET', f'/messages/{partner}/')
+
+    async def send_message(self):
+        if not self.partners:
+            return await self.read_messages()
+        partner = self.rng.choice(self.partners)
+        await self.call('POST /messages/<user>/', 'POST', f'/messages/{partner}/', {
+            'content': f'Load test message {self.rng.randint(1, 10 ** 6)}'
+        })
+
+    async def view_story(self):
+        response = await self.call('GET /stories/', 'GET', '/stories/')
+        if response is None:
+            return
+        self.remember('story_users', STORY_USER, response.text)
+        if not self.story_users:
+            return
+        author = self.rng.choice(self.story_users)
+        response = await self.call('GET /stories/<user>/', 'GET', f'/stories/{author}/')
+        if response is None:
+            return
+        for story_id in STORY_ID.findall(response.text)[:3]:
+            await self.call('GET /story/<id>/', 'GET', f'/story/{story_id}/')
+
+    async def notifications(self):
+        await self.call('GET /notifications/', 'GET', '/notifications/')
+        await self.call('GET /api/notifications/', 'GET', '/api/notifications/')
+
+    async def run(self, deadline, think_time, scenarios, weights):
+        try:
+            if not await self.login():
+                return
+            while time.monotonic() < deadline:
+                scenario = self.rng.choices(scenarios, weights=weights)[0]
+                await getattr(self, scenario)()
+                await asyncio.sleep(self.rng.expovariate(1 / think_time) if think_time else 0)
+        finally:
+            await self.client.close()
+
+
+async def run_load_test(options):
+    stats = Stats()
+    rng = random.Random(options.seed)
+    scenarios = list(TRAFFIC_MIX)
+    weights = [TRAFFIC_MIX[name] for name in scenarios]
+    deadline = time.monotonic() + options.duration
+
+    async def start(index):
+        # Spread logins over the ramp-up period
+        await asyncio.sleep(options.ramp_up * index / max(options.users, 1))
+        username = f'{options.prefix}_{rng.randrange(options.dataset_users)}'
+        user = VirtualUser(username, options.password, options.url, stats, random.Random(rng.random()))
+        await user.run(deadline, options.think_time, scenarios, weights)
+
+    await asyncio.gather(*(start(i) for i in range(options.users)))
+    return stats.report()
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<28}{'reqs':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'err%':>7}")
+    for endpoint, row in report['endpoints'].items():
+        print(
+            f"{endpoint:<28}{row['requests']:>7}{row['rps']:>8.1f}{row['p50_ms']:>9.1f}"
+            f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}{row['error_rate'] * 100:>7.1f}"
+        )
+        if row['first_error']:
+            print(f"{'':<28}first error: {row['first_error']}")
+    print(
+        f"\n{report['requests']} requests in {report['duration_s']}s, "
+        f"{report['rps']} req/s, {report['errors']} error(s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to load')
+    parser.add_argument('--users', type=int, default=50, help='Concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which users log in')
+    parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between actions (s)')
+    parser.add_argument('--prefix', default='synth', help='Username prefix of the synthetic users')
+    parser.add_argument('--dataset-users', type=int, default=1000, help='How many synthetic users exist')
+    parser.add_argument('--password', default='benchpass123', help='Password of the synthetic users')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--json', help='Also write the report to this file')
+    options = parser.parse_args()
+
+    print(f'🚀 {options.users} users against {options.url} for {options.duration:.0f}s')
+    report = asyncio.run(run_load_test(options))
+    print_report(report)
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 from pathlib import Path
 import os
+import importlib.util
 import dj_database_url
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import cloudinary  # Add this import
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -58,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'social_media.urls'
@@ -152,8 +155,61 @@ DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache backend: 'redis' (the production default; needs REDIS_URL and the redis
+# package), 'file', or 'locmem' (the local default).
+# Invalidation of the cached pages, versions and sets in core/ (caching.py,
+# likes.py, stories.py, memberships.py, page_cache.py) is a cache write, so with
+# more than one worker process it only takes effect everywhere on a shared
+# backend. locmem is per process and only suits a single local worker.
+CACHE_BACKEND = config('CACHE_BACKEND', default='redis' if IS_RENDER else 'locmem')
+REDIS_URL = config('REDIS_URL', default='')
+
+if CACHE_BACKEND == 'redis':
+    if not REDIS_URL:
+        raise ImproperlyConfigured("CACHE_BACKEND is 'redis' but REDIS_URL is not set")
+    if not importlib.util.find_spec('redis'):
+        raise ImproperlyConfigured("CACHE_BACKEND is 'redis' but the redis package is not installed")
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / '.django_cache')),
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'universe',
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'Unknown CACHE_BACKEND {CACHE_BACKEND!r}')
+CACHES['default']['KEY_PREFIX'] = 'universe'
+CACHES['default']['TIMEOUT'] = 300
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'feed'
 LOGOUT_REDIRECT_URL = 'login'
 
-ENABLE_AI_FEATURES = config('ENABLE_AI_FEATURES', default='True') == 'True'
\ No newline at end of file
+ENABLE_AI_FEATURES = config('ENABLE_AI_FEATURES', default='True') == 'True'
+# Activity retention in days (see core/retention.py and the prune_activity command)
+NOTIFICATION_RETENTION_DAYS = {
+    'like': 30,
+    'follow': 90,
+    'comment': 90,
+    'message': 90,
+}
+STORY_VIEW_RETENTION_DAYS = 30
+
+# Per-request query accounting (see core/middleware.py); always on in DEBUG
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default='False') == 'True'
+QUERY_BUDGET = 50
+SLOW_REQUEST_SECONDS = 0.5
+QUERY_BUDGET_N_PLUS_ONE_THRESHOLD = 5